@@ -29,6 +29,19 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_pre_ping": True,
 }
 
+# Configure the on-disk search index shared by all workers
+app.config["SEARCH_INDEX_PATH"] = os.environ.get("SEARCH_INDEX_PATH", os.path.join(app.instance_path, "search_index.bin"))
+
+# Load the food classifier in the background at boot instead of on the first upload
+app.config["ML_WARMUP"] = os.environ.get("ML_WARMUP", "false").lower() in ("1", "true", "yes")
+
+# Unix socket of a local inference_server.py; unset to run the model inside each worker
+app.config["INFERENCE_SOCKET"] = os.environ.get("INFERENCE_SOCKET") or None
+
+# Runtime serving the classifier: keras, or numpy/onnx/tflite for a model written by export_model.py
+app.config["ML_BACKEND"] = os.environ.get("ML_BACKEND", "keras")
+app.config["ML_BACKEND_PATH"] = os.environ.get("ML_BACKEND_PATH") or None
+
 # Configure Flask-Login
 login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
@@ -37,7 +50,7 @@ login_manager.login_message = 'Please log in to access this page.'
 # Configure Flask-Mail
 app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
 app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
-app.config['MAIL_USE_TLS'] = True
+app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', 'true').lower() in ('1', 'true', 'yes')
 app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME', '')
 app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD', '')
 app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@healthmanager.com')
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Backfill the daily nutrition rollup from existing food logs
+Run once after upgrading, or any time the rollup needs rebuilding from the raw logs
+"""
+
+import argparse
+import logging
+from app import app, db
+from models import DailyNutrition
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def backfill_daily_nutrition(user_id=None):
+    """Rebuild the rollup rows for one user or all users"""
+    with app.app_context():
+        try:
+            db.create_all()
+            rows = DailyNutrition.rebuild(user_id)
+            db.session.commit()
+            logger.info(f"✅ Wrote {rows} daily nutrition rows")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"❌ Error rebuilding daily nutrition: {e}")
+            return False
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Rebuild daily nutrition totals from the food log')
+    parser.add_argument('--user-id', type=int, help='Only rebuild this user\'s totals')
+    args = parser.parse_args()
+    
+    logger.info("📊 Backfilling daily nutrition rollup")
+    if backfill_daily_nutrition(args.user_id):
+        logger.info("🎉 Daily nutrition backfill complete!")
+    else:
+        logger.error("💥 Daily nutrition backfill failed!")
+
+if __name__ == "__main__":
+    main()
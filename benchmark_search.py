@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark the recipe search index against the original per-node trie
+Builds both structures from the same synthetic catalog and reports memory,
+build time and query latency, checking prefix lookups against the trie and
+substring lookups against a brute-force scan of the catalog
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from load_all_recipes import create_comprehensive_recipes
+from models import Recipe
+from search_engine import InvertedIndex, recipe_terms
+
+DEFAULT_QUERIES = ['chicken', 'chick', 'pasta', 'tomato', 'cheese', 'rice', 'ken', 'choc', 'salad', 'garlic']
+
+class TrieNode:
+    def __init__(self):
+        self.children = {}
+        self.is_end = False
+        self.recipe_ids = set()
+
+class Trie:
+    """The original trie that stored a recipe ID set on every node"""
+    def __init__(self):
+        self.root = TrieNode()
+
+    def insert(self, word, recipe_id):
+        node = self.root
+        word = word.lower().strip()
+
+        for char in word:
+            if char not in node.children:
+                node.children[char] = TrieNode()
+            node = node.children[char]
+            node.recipe_ids.add(recipe_id)
+
+        node.is_end = True
+
+    def search(self, prefix):
+        node = self.root
+        prefix = prefix.lower().strip()
+
+        for char in prefix:
+            if char not in node.children:
+                return set()
+            node = node.children[char]
+
+        return node.recipe_ids
+
+    def search_partial(self, word):
+        word = word.lower().strip()
+        all_matches = set()
+        all_matches.update(self.search(word))
+        for i in range(len(word)):
+            all_matches.update(self.search(word[i:]))
+        return all_matches
+
+def build_catalog(copies):
+    """Replicate the bundled recipe collection into a synthetic catalog"""
+    base = create_comprehensive_recipes()
+    catalog = []
+    recipe_id = 1
+
+    for copy in range(copies):
+        for data in base:
+            catalog.append(Recipe(
+                id=recipe_id,
+                name=f"{data['name']} {copy}",
+                ingredients=data['ingredients'],
+                tags=data['tags'],
+                category=data['category']
+            ))
+            recipe_id += 1
+
+    return catalog
+
+def build_structures(structure_class, catalog):
+    """Index the catalog into name/ingredient/tag structures, measuring memory and time"""
+    tracemalloc.start()
+    started = time.perf_counter()
+
+    structures = {'name': structure_class(), 'ingredient': structure_class(), 'tag': structure_class()}
+    for recipe in catalog:
+        name_words, ingredient_words, tags = recipe_terms(recipe)
+        for word in name_words:
+            structures['name'].insert(word, recipe.id)
+        for word in ingredient_words:
+            structures['ingredient'].insert(word, recipe.id)
+        for tag in tags:
+            structures['tag'].insert(tag, recipe.id)
+
+    for structure in structures.values():
+        if hasattr(structure, 'freeze'):
+            structure.freeze()
+
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return structures, {'build_seconds': elapsed, 'memory_mb': current / 2**20, 'peak_mb': peak / 2**20}
+
+def scan_substring(catalog, field, query):
+    """Reference substring matches found by scanning every recipe's words"""
+    position = ('name', 'ingredient', 'tag').index(field)
+    query = query.lower()
+    return {
+        recipe.id for recipe in catalog
+        if any(query in word.lower().strip() for word in recipe_terms(recipe)[position])
+    }
+
+def time_queries(structures, method, queries, repeat):
+    """Average latency in milliseconds of a partial-match method across all fields"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            for structure in structures.values():
+                getattr(structure, method)(query)
+    return (time.perf_counter() - started) * 1000 / (repeat * len(queries))
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the compact search index with the legacy trie')
+    parser.add_argument('--copies', type=int, default=200, help='Times to replicate the bundled recipes')
+    parser.add_argument('--repeat', type=int, default=5, help='Query repetitions for latency timing')
+    parser.add_argument('--queries', nargs='*', default=DEFAULT_QUERIES)
+    args = parser.parse_args()
+
+    catalog = build_catalog(args.copies)
+    print(f"Catalog: {len(catalog)} recipes")
+
+    trie, trie_stats = build_structures(Trie, catalog)
+    index, index_stats = build_structures(InvertedIndex, catalog)
+
+    for query in args.queries:
+        for field in trie:
+            if trie[field].search(query) != index[field].search(query):
+                raise SystemExit(f"Prefix mismatch for {query!r} in {field} field")
+            if index[field].search_substring(query) != scan_substring(catalog, field, query):
+                raise SystemExit(f"Substring mismatch for {query!r} in {field} field")
+
+    trie_stats['query_ms'] = time_queries(trie, 'search_partial', args.queries, args.repeat)
+    index_stats['query_ms'] = time_queries(index, 'search_substring', args.queries, args.repeat)
+
+    print(f"{'':16}{'trie':>12}{'index':>12}")
+    for key in ('memory_mb', 'peak_mb', 'build_seconds', 'query_ms'):
+        print(f"{key:16}{trie_stats[key]:12.2f}{index_stats[key]:12.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Build the recipe search index and write it to disk
+Gunicorn workers memory-map this file instead of rebuilding the index at boot
+"""
+
+import argparse
+import logging
+from datetime import datetime, timedelta
+from app import app, db
+from models import RecipeChange
+from search_engine import RecipeSearchEngine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def build_search_index(path, prune_days=None):
+    """Rebuild the index from the recipe table and write it to path"""
+    with app.app_context():
+        engine = RecipeSearchEngine()
+        if not engine.is_initialized or not engine.save(path):
+            return False
+        
+        logger.info(f"✅ Search index for {engine.table_state['recipe_count']} recipes written to {path}")
+        
+        if prune_days is not None:
+            # Only drop entries the new file already covers and every worker has had time to replay.
+            # The newest entry always stays: without AUTOINCREMENT, SQLite would reuse IDs of an
+            # emptied table and workers filtering on id > change_seq would skip later writes
+            cutoff = datetime.utcnow() - timedelta(days=prune_days)
+            pruned = RecipeChange.query.filter(
+                RecipeChange.id < engine.table_state['change_seq'],
+                RecipeChange.created_at < cutoff
+            ).delete(synchronize_session=False)
+            db.session.commit()
+            logger.info(f"Pruned {pruned} recipe change log entries")
+        
+        return True
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Build the on-disk recipe search index')
+    parser.add_argument('--path', default=app.config['SEARCH_INDEX_PATH'], help='Index file to write')
+    parser.add_argument('--prune-days', type=int, help='Also delete change log entries older than this many days, keeping the newest')
+    args = parser.parse_args()
+    
+    logger.info("🔎 Building recipe search index")
+    if build_search_index(args.path, args.prune_days):
+        logger.info("🎉 Search index build complete!")
+    else:
+        logger.error("💥 Search index build failed!")
+
+if __name__ == "__main__":
+    main()
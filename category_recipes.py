@@ -0,0 +1,116 @@
+"""
+Recipe suggestions for every food category, precomputed for classification results
+"""
+import logging
+import threading
+import time
+from models import Recipe, db
+from search_engine import SYNC_INTERVAL, recipe_table_state
+
+# Recipes suggested for a classified food
+CATEGORY_RECIPE_LIMIT = 5
+
+class CategoryRecipeMap:
+    """In-memory map from each Food-101 category to its suggested recipe summaries
+    
+    A category's suggestions are the recipes assigned to it, else recipes
+    whose name contains the category name, else the newest recipes, which
+    is what classify_food used to query for on every upload. Only the
+    summaries some category suggests are kept, shared between categories,
+    and the map is rebuilt when the recipe change log moves. A category
+    missing from the categories file is resolved with one query and kept.
+    """
+    
+    SUMMARY_COLUMNS = (
+        Recipe.id, Recipe.name, Recipe.calories_per_serving,
+        Recipe.prep_time, Recipe.cook_time, Recipe.description
+    )
+    
+    def __init__(self, categories, limit=CATEGORY_RECIPE_LIMIT):
+        self.categories = categories
+        self.limit = limit
+        self.version = None
+        self.checked_at = 0.0
+        self.suggestions = {}
+        self._newest = ()
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self.suggestions)
+    
+    def summarize(self, recipe_ids):
+        """Summaries of the given recipes, keyed by ID, from one query"""
+        if not recipe_ids:
+            return {}
+        rows = db.session.query(*self.SUMMARY_COLUMNS).filter(Recipe.id.in_(recipe_ids)).all()
+        return {row.id: {column.key: getattr(row, column.key) for column in self.SUMMARY_COLUMNS} for row in rows}
+    
+    def refresh(self, force=False):
+        """Rebuild the map if recipes changed since it was built, checking at most every SYNC_INTERVAL seconds"""
+        now = time.monotonic()
+        if not force and self.version is not None and now - self.checked_at < SYNC_INTERVAL:
+            return
+        self.checked_at = now
+    
+        version = recipe_table_state()
+        if version == self.version:
+            return
+    
+        with self._lock:
+            rows = db.session.query(Recipe.id, Recipe.name, Recipe.food_category_id).order_by(Recipe.id).all()
+    
+            assigned = {}
+            for row in rows:
+                if row.food_category_id is not None:
+                    assigned.setdefault(row.food_category_id, []).append(row.id)
+    
+            # Names are only needed while matching, so they are not kept
+            names = [(row.id, row.name.lower()) for row in rows]
+            newest = tuple(row.id for row in reversed(rows[-self.limit:]))
+            recipe_ids = {
+                category_id: tuple(assigned_ids[:self.limit]) for category_id, assigned_ids in assigned.items()
+            }
+            for category_id, name in self.categories.items():
+                if int(category_id) not in recipe_ids:
+                    recipe_ids[int(category_id)] = self.match_name(names, name) or newest
+    
+            summaries = self.summarize(set(newest).union(*recipe_ids.values()))
+            # Recipes deleted between the two queries are skipped, like in the suggestions below
+            self._newest = tuple(summaries[recipe_id] for recipe_id in newest if recipe_id in summaries)
+            self.suggestions = {
+                category_id: tuple(summaries[recipe_id] for recipe_id in ids if recipe_id in summaries)
+                for category_id, ids in recipe_ids.items()
+            }
+    
+            self.version = version
+            logging.info(f"Category recipe map built for {len(self.suggestions)} categories "
+                         f"with {len(summaries)} of {len(rows)} recipes")
+    
+    def match_name(self, names, category_name):
+        """IDs of the first recipes whose name contains the category name"""
+        name = category_name.replace('_', ' ').lower()
+        return tuple(recipe_id for recipe_id, recipe_name in names if name in recipe_name)[:self.limit]
+    
+    def query_category(self, category_name):
+        """Summaries for a category outside the map, matched by name in the database, else the newest recipes"""
+        name = category_name.replace('_', ' ')
+        recipe_ids = [row.id for row in db.session.query(Recipe.id).filter(
+            Recipe.name.ilike(f'%{name}%')
+        ).order_by(Recipe.id).limit(self.limit)]
+        if not recipe_ids:
+            return self._newest
+        summaries = self.summarize(recipe_ids)
+        return tuple(summaries[recipe_id] for recipe_id in recipe_ids if recipe_id in summaries)
+    
+    def recipes(self, category_id, category_name):
+        """Suggested recipe summaries for a predicted category"""
+        self.refresh()
+    
+        suggestions = self.suggestions.get(category_id)
+        if suggestions is None:
+            # A category missing from the categories file is matched by its predicted name once
+            suggestions = self.query_category(category_name)
+            with self._lock:
+                suggestions = self.suggestions.setdefault(category_id, suggestions)
+    
+        return list(suggestions)
@@ -15,7 +15,7 @@ class Config:
     # Mail configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
-    MAIL_USE_TLS = True
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'true').lower() in ('1', 'true', 'yes')
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME', '')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD', '')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@healthmanager.com')
@@ -28,6 +28,13 @@ class Config:
     # ML Model configuration
     FOOD101_DATASET_PATH = os.environ.get('FOOD101_DATASET_PATH', 'data/food_c101_n10099_r32x32x1.h5')
     MODEL_PATH = 'food_classifier_model.h5'
+    ML_WARMUP = os.environ.get('ML_WARMUP', 'false').lower() in ('1', 'true', 'yes')
+    INFERENCE_SOCKET = os.environ.get('INFERENCE_SOCKET') or None
+    ML_BACKEND = os.environ.get('ML_BACKEND', 'keras')
+    ML_BACKEND_PATH = os.environ.get('ML_BACKEND_PATH') or None
+    
+    # Search index configuration
+    SEARCH_INDEX_PATH = os.environ.get('SEARCH_INDEX_PATH', 'instance/search_index.bin')
     
     # Application settings
     RECIPES_PER_PAGE = 12
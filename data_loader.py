@@ -47,7 +47,7 @@ class DataLoader:
                     recipe = Recipe(
                         name=recipe_data['name'],
                         description=recipe_data.get('description', ''),
-                        ingredients=json.dumps(recipe_data.get('ingredients', [])),
+                        ingredients=recipe_data.get('ingredients', []),
                         instructions=recipe_data.get('instructions', ''),
                         prep_time=recipe_data.get('prep_time', 0),
                         cook_time=recipe_data.get('cook_time', 0),
@@ -60,7 +60,7 @@ class DataLoader:
                         sugar=recipe_data.get('sugar', 0),
                         sodium=recipe_data.get('sodium', 0),
                         category=recipe_data.get('category', 'Unknown'),
-                        tags=json.dumps(recipe_data.get('tags', [])),
+                        tags=recipe_data.get('tags', []),
                         food_category_id=recipe_data.get('food_category_id')
                     )
                     db.session.add(recipe)
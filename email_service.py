@@ -1,15 +1,316 @@
 from flask import current_app, render_template_string
-from flask_mail import Message
+from flask_mail import BadHeaderError, Message
 from app import mail
+import atexit
 import logging
+import queue
+import smtplib
+import threading
 from datetime import date, timedelta
 from health_calculator import HealthCalculator
 
+# Delivery threads, each holding its own SMTP connection
+MAIL_QUEUE_WORKERS = 2
+
+# Delivery attempts per message, and the delay before the first retry, doubled after each one
+MAIL_MAX_ATTEMPTS = 5
+MAIL_RETRY_BACKOFF = 2.0
+
+# Seconds a worker keeps an idle SMTP connection open for the next message
+MAIL_IDLE_TIMEOUT = 30.0
+
+# Seconds the process waits at exit for queued emails to go out
+MAIL_SHUTDOWN_TIMEOUT = 10.0
+
+def is_permanent_failure(error):
+    """Whether retrying a failed delivery cannot succeed"""
+    if isinstance(error, (smtplib.SMTPRecipientsRefused, BadHeaderError, AssertionError)):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+class MailQueue:
+    """Delivers queued emails on background threads that reuse their SMTP connections
+
+    Each worker opens a connection with mail.connect() for the first message
+    it takes and sends everything else it gets through it, closing it after
+    MAIL_IDLE_TIMEOUT seconds without mail. A failed delivery drops the
+    connection and is retried with exponential backoff unless the server
+    rejected it permanently. Messages are held in memory, so the process
+    waits up to MAIL_SHUTDOWN_TIMEOUT seconds at exit for the queue to drain.
+    """
+    
+    def __init__(self, workers=MAIL_QUEUE_WORKERS, max_attempts=MAIL_MAX_ATTEMPTS,
+                 backoff=MAIL_RETRY_BACKOFF, idle_timeout=MAIL_IDLE_TIMEOUT):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.app = None
+        self.pending = 0
+        self.waiting_retry = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+    
+    def enqueue(self, message, on_sent=None):
+        """Queue a message for delivery by the current app's mail settings
+        
+        Args:
+            message: Flask-Mail Message
+            on_sent: Optional callable run on a delivery thread once the message is accepted
+        """
+        with self._lock:
+            if self.app is None:
+                self.app = current_app._get_current_object()
+                atexit.register(self.flush, MAIL_SHUTDOWN_TIMEOUT)
+            self.pending += 1
+            self._ensure_workers()
+        self._queue.put((message, 1, on_sent))
+    
+    def flush(self, timeout=None, pending=0):
+        """Wait until at most pending messages are still undelivered, returning whether that happened"""
+        with self._drained:
+            return self._drained.wait_for(lambda: self.pending <= pending, timeout)
+    
+    def discard(self):
+        """Drop every message still waiting for a delivery thread, returning how many"""
+        dropped = 0
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            dropped += 1
+        
+        with self._lock:
+            self.pending -= dropped
+            self._drained.notify_all()
+        return dropped
+    
+    def stats(self):
+        """Queue depth and delivery counters"""
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'waiting_retry': self.waiting_retry,
+                'pending': self.pending,
+                'sent': self.sent,
+                'failed': self.failed,
+                'retries': self.retries,
+                'workers': sum(thread.is_alive() for thread in self._threads)
+            }
+    
+    def _ensure_workers(self):
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name=f'mail-queue-{len(self._threads)}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def _next(self):
+        try:
+            return self._queue.get(timeout=self.idle_timeout)
+        except queue.Empty:
+            return None
+    
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                item = self._queue.get()
+                try:
+                    with mail.connect() as connection:
+                        while item is not None:
+                            message, _, on_sent = item
+                            connection.send(message)
+                            item = None
+                            # Run the callback before counting the message so flush() waits for it too
+                            try:
+                                if on_sent is not None:
+                                    on_sent()
+                            finally:
+                                self._finish(sent=True)
+                            item = self._next()
+                except Exception as e:
+                    # Closing an idle connection can fail too, with nothing left to retry
+                    if item is not None:
+                        self._retry(*item, e)
+    
+    def _retry(self, message, attempt, on_sent, error):
+        recipients = ', '.join(str(recipient) for recipient in message.send_to)
+        if is_permanent_failure(error) or attempt >= self.max_attempts:
+            logging.error(f"Failed to send email to {recipients} after {attempt} attempt(s): {error}")
+            self._finish(sent=False)
+            return
+        
+        delay = self.backoff * 2 ** (attempt - 1)
+        logging.warning(f"Email to {recipients} failed ({error}), retrying in {delay:g}s")
+        with self._lock:
+            self.retries += 1
+            self.waiting_retry += 1
+        timer = threading.Timer(delay, self._requeue, args=(message, attempt + 1, on_sent))
+        timer.daemon = True
+        timer.start()
+    
+    def _requeue(self, message, attempt, on_sent):
+        with self._lock:
+            self.waiting_retry -= 1
+        self._queue.put((message, attempt, on_sent))
+    
+    def _finish(self, sent):
+        with self._lock:
+            self.pending -= 1
+            if sent:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self._drained.notify_all()
+
+mail_queue = MailQueue()
+
+def render_email(template_source, **context):
+    """Render an email template, compiling it once per app"""
+    templates = current_app.extensions.setdefault('email_templates', {})
+    template = templates.get(template_source)
+    if template is None:
+        template = templates[template_source] = current_app.jinja_env.from_string(template_source)
+    return template.render(**context)
+
+DAILY_SUMMARY_TEMPLATE = """
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+        .header { background-color: #007bff; color: white; padding: 20px; text-align: center; }
+        .content { padding: 20px; background-color: #f8f9fa; }
+        .stats { display: flex; justify-content: space-between; margin: 20px 0; }
+        .stat { text-align: center; flex: 1; }
+        .stat-value { font-size: 24px; font-weight: bold; color: #007bff; }
+        .progress-bar { background-color: #e9ecef; height: 20px; border-radius: 10px; overflow: hidden; }
+        .progress-fill { background-color: #28a745; height: 100%; transition: width 0.3s; }
+        .recommendations { margin: 20px 0; }
+        .recommendation { background-color: white; padding: 10px; margin: 5px 0; border-left: 4px solid #007bff; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>Daily Health Summary</h1>
+            <p>{{ date }}</p>
+        </div>
+        <div class="content">
+            <h2>Today's Nutrition</h2>
+            <div class="stats">
+                <div class="stat">
+                    <div class="stat-value">{{ calories }}</div>
+                    <div>Calories</div>
+                </div>
+                <div class="stat">
+                    <div class="stat-value">{{ protein }}g</div>
+                    <div>Protein</div>
+                </div>
+                <div class="stat">
+                    <div class="stat-value">{{ carbs }}g</div>
+                    <div>Carbs</div>
+                </div>
+                <div class="stat">
+                    <div class="stat-value">{{ fat }}g</div>
+                    <div>Fat</div>
+                </div>
+            </div>
+
+            <h3>Calorie Goal Progress</h3>
+            <div class="progress-bar">
+                <div class="progress-fill" style="width: {{ progress }}%"></div>
+            </div>
+            <p>{{ calories }} / {{ goal }} calories ({{ progress }}%)</p>
+
+            {% if recommendations %}
+            <div class="recommendations">
+                <h3>Health Recommendations</h3>
+                {% for rec in recommendations %}
+                <div class="recommendation">{{ rec }}</div>
+                {% endfor %}
+            </div>
+            {% endif %}
+
+            <p>Keep up the great work! Remember to stay hydrated and get enough sleep.</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+WEEKLY_SUMMARY_TEMPLATE = """
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+        .header { background-color: #28a745; color: white; padding: 20px; text-align: center; }
+        .content { padding: 20px; background-color: #f8f9fa; }
+        .stats { display: flex; justify-content: space-between; margin: 20px 0; }
+        .stat { text-align: center; flex: 1; }
+        .stat-value { font-size: 24px; font-weight: bold; color: #28a745; }
+        .recommendations { margin: 20px 0; }
+        .recommendation { background-color: white; padding: 10px; margin: 5px 0; border-left: 4px solid #28a745; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>Weekly Health Summary</h1>
+            <p>{{ week_range }}</p>
+        </div>
+        <div class="content">
+            <h2>Weekly Averages</h2>
+            <div class="stats">
+                <div class="stat">
+                    <div class="stat-value">{{ avg_calories }}</div>
+                    <div>Avg Calories</div>
+                </div>
+                <div class="stat">
+                    <div class="stat-value">{{ avg_protein }}g</div>
+                    <div>Avg Protein</div>
+                </div>
+                <div class="stat">
+                    <div class="stat-value">{{ avg_carbs }}g</div>
+                    <div>Avg Carbs</div>
+                </div>
+                <div class="stat">
+                    <div class="stat-value">{{ avg_fat }}g</div>
+                    <div>Avg Fat</div>
+                </div>
+            </div>
+
+            <h3>Weekly Performance</h3>
+            <p>Your average daily intake was {{ avg_calories }} calories, which is {{ progress }}% of your {{ goal }} calorie goal.</p>
+
+            {% if recommendations %}
+            <div class="recommendations">
+                <h3>Health Recommendations</h3>
+                {% for rec in recommendations %}
+                <div class="recommendation">{{ rec }}</div>
+                {% endfor %}
+            </div>
+            {% endif %}
+
+            <p>Great job tracking your nutrition this week! Keep up the healthy habits.</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
 class EmailService:
     
     @staticmethod
     def send_email(to, subject, html_body, text_body=None):
-        """Send an email"""
+        """Queue an email for background delivery, returning whether it was queued"""
         try:
             msg = Message(
                 subject=subject,
@@ -17,13 +318,66 @@ class EmailService:
                 html=html_body,
                 body=text_body or html_body
             )
-            mail.send(msg)
-            logging.info(f"Email sent successfully to {to}")
+            mail_queue.enqueue(msg)
+            logging.info(f"Email to {to} queued for delivery")
             return True
         except Exception as e:
-            logging.error(f"Failed to send email to {to}: {e}")
+            logging.error(f"Failed to queue email to {to}: {e}")
             return False
     
+    @staticmethod
+    def render_daily_summary(user, today_data, recommendations, day=None):
+        """Subject and HTML body of a daily nutrition summary"""
+        day = day or date.today()
+        
+        # Get calorie goal
+        calorie_goal = user.daily_calorie_goal or user.calculate_daily_calories() or 2000
+        
+        # Calculate progress
+        calorie_progress = (today_data['calories'] / calorie_goal * 100) if calorie_goal > 0 else 0
+        
+        subject = f"Daily Health Summary - {day.strftime('%B %d, %Y')}"
+        html_body = render_email(DAILY_SUMMARY_TEMPLATE,
+            date=day.strftime('%B %d, %Y'),
+            calories=int(today_data['calories']),
+            protein=round(today_data['protein'], 1),
+            carbs=round(today_data['carbs'], 1),
+            fat=round(today_data['fat'], 1),
+            progress=min(100, round(calorie_progress, 1)),
+            goal=calorie_goal,
+            recommendations=recommendations
+        )
+        return subject, html_body
+    
+    @staticmethod
+    def render_weekly_summary(user, nutrition_summary, recommendations, day=None):
+        """Subject and HTML body of a weekly summary of the 7 days ending on day"""
+        week_end = day or date.today()
+        week_start = week_end - timedelta(days=6)
+        
+        # Calculate weekly averages
+        avg_calories = nutrition_summary['avg_calories']
+        
+        # Get calorie goal
+        calorie_goal = user.daily_calorie_goal or user.calculate_daily_calories() or 2000
+        
+        # Calculate weekly progress
+        weekly_progress = (avg_calories / calorie_goal * 100) if calorie_goal > 0 else 0
+        
+        subject = f"Weekly Health Summary - Week of {week_start.strftime('%B %d, %Y')}"
+        week_range = f"{week_start.strftime('%B %d')} - {week_end.strftime('%B %d, %Y')}"
+        html_body = render_email(WEEKLY_SUMMARY_TEMPLATE,
+            week_range=week_range,
+            avg_calories=round(avg_calories, 1),
+            avg_protein=round(nutrition_summary['avg_protein'], 1),
+            avg_carbs=round(nutrition_summary['avg_carbs'], 1),
+            avg_fat=round(nutrition_summary['avg_fat'], 1),
+            progress=round(weekly_progress, 1),
+            goal=calorie_goal,
+            recommendations=recommendations
+        )
+        return subject, html_body
+    
     @staticmethod
     def send_daily_summary(user):
         """Send daily nutrition summary email"""
@@ -34,94 +388,10 @@ class EmailService:
                 'calories': 0, 'protein': 0, 'carbs': 0, 'fat': 0, 'meals': 0
             })
             
-            # Get calorie goal
-            calorie_goal = user.daily_calorie_goal or user.calculate_daily_calories() or 2000
-            
-            # Calculate progress
-            calorie_progress = (today_data['calories'] / calorie_goal * 100) if calorie_goal > 0 else 0
-            
             # Get health recommendations
             recommendations = HealthCalculator.get_health_recommendations(user)
             
-            subject = f"Daily Health Summary - {date.today().strftime('%B %d, %Y')}"
-            
-            html_template = """
-            <html>
-            <head>
-                <style>
-                    body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
-                    .container { max-width: 600px; margin: 0 auto; padding: 20px; }
-                    .header { background-color: #007bff; color: white; padding: 20px; text-align: center; }
-                    .content { padding: 20px; background-color: #f8f9fa; }
-                    .stats { display: flex; justify-content: space-between; margin: 20px 0; }
-                    .stat { text-align: center; flex: 1; }
-                    .stat-value { font-size: 24px; font-weight: bold; color: #007bff; }
-                    .progress-bar { background-color: #e9ecef; height: 20px; border-radius: 10px; overflow: hidden; }
-                    .progress-fill { background-color: #28a745; height: 100%; transition: width 0.3s; }
-                    .recommendations { margin: 20px 0; }
-                    .recommendation { background-color: white; padding: 10px; margin: 5px 0; border-left: 4px solid #007bff; }
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h1>Daily Health Summary</h1>
-                        <p>{{ date }}</p>
-                    </div>
-                    <div class="content">
-                        <h2>Today's Nutrition</h2>
-                        <div class="stats">
-                            <div class="stat">
-                                <div class="stat-value">{{ calories }}</div>
-                                <div>Calories</div>
-                            </div>
-                            <div class="stat">
-                                <div class="stat-value">{{ protein }}g</div>
-                                <div>Protein</div>
-                            </div>
-                            <div class="stat">
-                                <div class="stat-value">{{ carbs }}g</div>
-                                <div>Carbs</div>
-                            </div>
-                            <div class="stat">
-                                <div class="stat-value">{{ fat }}g</div>
-                                <div>Fat</div>
-                            </div>
-                        </div>
-                        
-                        <h3>Calorie Goal Progress</h3>
-                        <div class="progress-bar">
-                            <div class="progress-fill" style="width: {{ progress }}%"></div>
-                        </div>
-                        <p>{{ calories }} / {{ goal }} calories ({{ progress }}%)</p>
-                        
-                        {% if recommendations %}
-                        <div class="recommendations">
-                            <h3>Health Recommendations</h3>
-                            {% for rec in recommendations %}
-                            <div class="recommendation">{{ rec }}</div>
-                            {% endfor %}
-                        </div>
-                        {% endif %}
-                        
-                        <p>Keep up the great work! Remember to stay hydrated and get enough sleep.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
-            html_body = render_template_string(html_template,
-                date=date.today().strftime('%B %d, %Y'),
-                calories=int(today_data['calories']),
-                protein=round(today_data['protein'], 1),
-                carbs=round(today_data['carbs'], 1),
-                fat=round(today_data['fat'], 1),
-                progress=min(100, round(calorie_progress, 1)),
-                goal=calorie_goal,
-                recommendations=recommendations
-            )
-            
+            subject, html_body = EmailService.render_daily_summary(user, today_data, recommendations)
             return EmailService.send_email(user.email, subject, html_body)
             
         except Exception as e:
@@ -135,99 +405,10 @@ class EmailService:
             # Get weekly nutrition data
             nutrition_summary = HealthCalculator.get_nutrition_summary(user.id, days=7)
             
-            # Calculate weekly averages
-            avg_calories = nutrition_summary['avg_calories']
-            avg_protein = nutrition_summary['avg_protein']
-            avg_carbs = nutrition_summary['avg_carbs']
-            avg_fat = nutrition_summary['avg_fat']
-            
-            # Get calorie goal
-            calorie_goal = user.daily_calorie_goal or user.calculate_daily_calories() or 2000
-            
-            # Calculate weekly progress
-            weekly_progress = (avg_calories / calorie_goal * 100) if calorie_goal > 0 else 0
-            
             # Get health recommendations
-            recommendations = HealthCalculator.get_health_recommendations(user)
-            
-            subject = f"Weekly Health Summary - Week of {(date.today() - timedelta(days=6)).strftime('%B %d, %Y')}"
-            
-            html_template = """
-            <html>
-            <head>
-                <style>
-                    body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
-                    .container { max-width: 600px; margin: 0 auto; padding: 20px; }
-                    .header { background-color: #28a745; color: white; padding: 20px; text-align: center; }
-                    .content { padding: 20px; background-color: #f8f9fa; }
-                    .stats { display: flex; justify-content: space-between; margin: 20px 0; }
-                    .stat { text-align: center; flex: 1; }
-                    .stat-value { font-size: 24px; font-weight: bold; color: #28a745; }
-                    .recommendations { margin: 20px 0; }
-                    .recommendation { background-color: white; padding: 10px; margin: 5px 0; border-left: 4px solid #28a745; }
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h1>Weekly Health Summary</h1>
-                        <p>{{ week_range }}</p>
-                    </div>
-                    <div class="content">
-                        <h2>Weekly Averages</h2>
-                        <div class="stats">
-                            <div class="stat">
-                                <div class="stat-value">{{ avg_calories }}</div>
-                                <div>Avg Calories</div>
-                            </div>
-                            <div class="stat">
-                                <div class="stat-value">{{ avg_protein }}g</div>
-                                <div>Avg Protein</div>
-                            </div>
-                            <div class="stat">
-                                <div class="stat-value">{{ avg_carbs }}g</div>
-                                <div>Avg Carbs</div>
-                            </div>
-                            <div class="stat">
-                                <div class="stat-value">{{ avg_fat }}g</div>
-                                <div>Avg Fat</div>
-                            </div>
-                        </div>
-                        
-                        <h3>Weekly Performance</h3>
-                        <p>Your average daily intake was {{ avg_calories }} calories, which is {{ progress }}% of your {{ goal }} calorie goal.</p>
-                        
-                        {% if recommendations %}
-                        <div class="recommendations">
-                            <h3>Health Recommendations</h3>
-                            {% for rec in recommendations %}
-                            <div class="recommendation">{{ rec }}</div>
-                            {% endfor %}
-                        </div>
-                        {% endif %}
-                        
-                        <p>Great job tracking your nutrition this week! Keep up the healthy habits.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
-            week_start = date.today() - timedelta(days=6)
-            week_end = date.today()
-            week_range = f"{week_start.strftime('%B %d')} - {week_end.strftime('%B %d, %Y')}"
-            
-            html_body = render_template_string(html_template,
-                week_range=week_range,
-                avg_calories=round(avg_calories, 1),
-                avg_protein=round(avg_protein, 1),
-                avg_carbs=round(avg_carbs, 1),
-                avg_fat=round(avg_fat, 1),
-                progress=round(weekly_progress, 1),
-                goal=calorie_goal,
-                recommendations=recommendations
-            )
+            recommendations = HealthCalculator.get_health_recommendations(user, nutrition_summary)
             
+            subject, html_body = EmailService.render_weekly_summary(user, nutrition_summary, recommendations)
             return EmailService.send_email(user.email, subject, html_body)
             
         except Exception as e:
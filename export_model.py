@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Export the trained food classifier for serving without TensorFlow
+Converts food_classifier_model.h5 to NumPy weights, ONNX or TFLite, optionally
+with int8 weights, then checks the export agrees with the Keras model. Serve
+it by setting ML_BACKEND to the same format
+"""
+
+import argparse
+import logging
+import os
+import sys
+import numpy as np
+import ml_model
+from ml_model import ACTIVATIONS, INFERENCE_BACKENDS, INPUT_SHAPE, exported_model_path
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def quantize_int8(kernel):
+    """Symmetric int8 weights with one float32 scale per output unit"""
+    scale = np.abs(kernel).max(axis=0) / 127.0
+    scale[scale == 0] = 1.0
+    quantized = np.clip(np.round(kernel / scale), -127, 127).astype(np.int8)
+    return quantized, scale.astype(np.float32)
+
+def dense_layers(model):
+    """Kernel, bias and activation of each Dense layer, skipping layers that are no-ops at inference"""
+    dense = []
+    for layer in model.layers:
+        kind = type(layer).__name__
+        if kind == 'Dense':
+            kernel, bias = layer.get_weights()
+            activation = layer.get_config()['activation']
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"Layer {layer.name} uses unsupported activation {activation!r}")
+            dense.append((kernel, bias, activation))
+        elif kind not in ('Flatten', 'Dropout', 'InputLayer'):
+            raise ValueError(f"Layer {layer.name} ({kind}) has no NumPy equivalent")
+    return dense
+
+def export_numpy(model, output_path, int8=False):
+    """Write the Dense stack's weights as an .npz for the NumPy backend"""
+    arrays = {}
+    activations = []
+    for i, (kernel, bias, activation) in enumerate(dense_layers(model)):
+        if int8:
+            arrays[f'kernel_{i}'], arrays[f'scale_{i}'] = quantize_int8(kernel)
+        else:
+            arrays[f'kernel_{i}'] = kernel.astype(np.float32)
+        arrays[f'bias_{i}'] = bias.astype(np.float32)
+        activations.append(activation)
+
+    # Through a file object so np.savez does not append its own extension
+    with open(output_path, 'wb') as f:
+        np.savez(f, activations=np.array(activations), **arrays)
+
+def export_onnx(model, output_path, int8=False):
+    """Convert the model to ONNX with tf2onnx, quantizing weights with onnxruntime"""
+    import tf2onnx
+    signature = (ml_model.tf.TensorSpec((None,) + INPUT_SHAPE, ml_model.tf.float32, name='image'),)
+    if not int8:
+        tf2onnx.convert.from_keras(model, input_signature=signature, output_path=output_path)
+        return
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    float_path = f"{os.path.splitext(output_path)[0]}.float32.onnx"
+    tf2onnx.convert.from_keras(model, input_signature=signature, output_path=float_path)
+    try:
+        quantize_dynamic(float_path, output_path, weight_type=QuantType.QInt8)
+    finally:
+        os.remove(float_path)
+
+def export_tflite(model, output_path, int8=False):
+    """Convert the model to TFLite, with dynamic-range int8 weights if asked"""
+    converter = ml_model.tf.lite.TFLiteConverter.from_keras_model(model)
+    if int8:
+        converter.optimizations = [ml_model.tf.lite.Optimize.DEFAULT]
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+
+EXPORTERS = {
+    'numpy': export_numpy,
+    'onnx': export_onnx,
+    'tflite': export_tflite
+}
+
+def compare(model, backend, samples=256):
+    """Largest probability difference and top-1 agreement between Keras and the export"""
+    batch = np.random.default_rng(0).random((samples,) + INPUT_SHAPE, dtype=np.float32)
+    expected = model.predict(batch, batch_size=samples, verbose=0)
+    actual = backend.predict(batch)
+    return float(np.abs(expected - actual).max()), float((expected.argmax(axis=1) == actual.argmax(axis=1)).mean())
+
+def export_model(model_path, export_format, output_path, int8=False):
+    """Export the Keras model and verify it in its backend, returning whether both worked"""
+    if not ml_model.load_ml_dependencies():
+        logger.error("❌ TensorFlow is needed to read the Keras model")
+        return False
+    if not os.path.exists(model_path):
+        logger.error(f"❌ No trained model at {model_path}")
+        return False
+
+    try:
+        model = ml_model.keras.models.load_model(model_path)
+        EXPORTERS[export_format](model, output_path, int8)
+        logger.info(f"📦 Wrote {output_path} ({os.path.getsize(output_path) / 1024:.0f} KB, "
+                    f"Keras model {os.path.getsize(model_path) / 1024:.0f} KB)")
+    except Exception as e:
+        logger.error(f"❌ Error exporting model: {e}")
+        return False
+
+    try:
+        max_difference, agreement = compare(model, INFERENCE_BACKENDS[export_format](output_path))
+        logger.info(f"🔍 Max probability difference {max_difference:.5f}, top-1 agreement {agreement:.1%}")
+    except ImportError as e:
+        logger.warning(f"⚠️ Could not verify the export, its runtime is not installed: {e}")
+    except Exception as e:
+        logger.error(f"❌ Exported model does not run: {e}")
+        return False
+
+    return True
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Export the food classifier for serving without TensorFlow')
+    parser.add_argument('--format', choices=sorted(EXPORTERS), default='numpy', help='Export format')
+    parser.add_argument('--model', default='food_classifier_model.h5', help='Trained Keras model')
+    parser.add_argument('--output', help='Output path (default: the model path with the format extension)')
+    parser.add_argument('--int8', action='store_true', help='Quantize weights to int8')
+    args = parser.parse_args()
+
+    output_path = args.output or exported_model_path(args.model, args.format)
+    logger.info(f"🚀 Exporting {args.model} as {args.format}{' (int8)' if args.int8 else ''}")
+    if export_model(args.model, args.format, output_path, args.int8):
+        logger.info(f"🎉 Export complete! Serve it with ML_BACKEND={args.format} ML_BACKEND_PATH={output_path}")
+    else:
+        logger.error("💥 Export failed!")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
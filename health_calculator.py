@@ -1,6 +1,6 @@
 import math
 from datetime import date, datetime, timedelta
-from models import User, FoodLog
+from models import User, DailyNutrition
 from app import db
 
 class HealthCalculator:
@@ -158,70 +158,58 @@ class HealthCalculator:
         end_date = date.today()
         start_date = end_date - timedelta(days=days-1)
         
-        logs = FoodLog.query.filter(
-            FoodLog.user_id == user_id,
-            FoodLog.date_logged >= start_date,
-            FoodLog.date_logged <= end_date
+        rollups = DailyNutrition.query.filter(
+            DailyNutrition.user_id == user_id,
+            DailyNutrition.date >= start_date,
+            DailyNutrition.date <= end_date
         ).all()
         
-        total_calories = 0
-        total_protein = 0
-        total_carbs = 0
-        total_fat = 0
+        totals = {'calories': 0, 'protein': 0, 'carbs': 0, 'fat': 0}
         daily_data = {}
         
-        for log in logs:
-            day_str = log.date_logged.isoformat()
-            if day_str not in daily_data:
-                daily_data[day_str] = {
-                    'calories': 0,
-                    'protein': 0,
-                    'carbs': 0,
-                    'fat': 0,
-                    'meals': 0
-                }
+        for rollup in rollups:
+            daily_data[rollup.date.isoformat()] = {
+                'calories': rollup.calories,
+                'protein': rollup.protein,
+                'carbs': rollup.carbs,
+                'fat': rollup.fat,
+                'meals': rollup.meals
+            }
             
-            calories = log.calories * log.servings
-            protein = log.protein * log.servings
-            carbs = log.carbs * log.servings
-            fat = log.fat * log.servings
-            
-            daily_data[day_str]['calories'] += calories
-            daily_data[day_str]['protein'] += protein
-            daily_data[day_str]['carbs'] += carbs
-            daily_data[day_str]['fat'] += fat
-            daily_data[day_str]['meals'] += 1
-            
-            total_calories += calories
-            total_protein += protein
-            total_carbs += carbs
-            total_fat += fat
-        
-        avg_calories = total_calories / days if days > 0 else 0
-        avg_protein = total_protein / days if days > 0 else 0
-        avg_carbs = total_carbs / days if days > 0 else 0
-        avg_fat = total_fat / days if days > 0 else 0
-        
-        return {
-            'days_analyzed': days,
-            'total_calories': total_calories,
-            'total_protein': total_protein,
-            'total_carbs': total_carbs,
-            'total_fat': total_fat,
-            'avg_calories': round(avg_calories, 1),
-            'avg_protein': round(avg_protein, 1),
-            'avg_carbs': round(avg_carbs, 1),
-            'avg_fat': round(avg_fat, 1),
-            'daily_data': daily_data
-        }
+            for name in totals:
+                totals[name] += getattr(rollup, name)
+        
+        return HealthCalculator.summarize_nutrition(totals, days, daily_data)
     
     @staticmethod
-    def get_health_recommendations(user):
+    def summarize_nutrition(totals, days, daily_data=None):
+        """
+        Build a nutrition summary from totals over a number of days
+        
+        Args:
+            totals: Dictionary of total calories, protein, carbs and fat
+            days: Number of days the totals cover
+            daily_data: Optional per-day totals keyed by ISO date
+        
+        Returns:
+            Dictionary with nutrition summary, as returned by get_nutrition_summary
+        """
+        summary = {'days_analyzed': days}
+        for name in ('calories', 'protein', 'carbs', 'fat'):
+            summary[f'total_{name}'] = totals[name]
+        for name in ('calories', 'protein', 'carbs', 'fat'):
+            summary[f'avg_{name}'] = round(totals[name] / days if days > 0 else 0, 1)
+        summary['daily_data'] = daily_data or {}
+        return summary
+    
+    @staticmethod
+    def get_health_recommendations(user, nutrition_summary=None):
         """
         Get personalized health recommendations for a user
         
         Args:
             user: User object
+            nutrition_summary: The user's 7-day nutrition summary, queried if not given
         
         Returns:
             List of recommendation strings
@@ -253,10 +241,12 @@ class HealthCalculator:
         elif user.activity_level in ['light', 'moderate']:
             recommendations.append("Great job staying active! Consider adding some strength training to your routine")
         
+        # Get recent nutrition data
+        if nutrition_summary is None:
+            nutrition_summary = HealthCalculator.get_nutrition_summary(user.id, days=7)
+        
         # Calorie recommendations
         if user.daily_calorie_goal:
-            # Get recent nutrition data
-            nutrition_summary = HealthCalculator.get_nutrition_summary(user.id, days=7)
             avg_calories = nutrition_summary['avg_calories']
             
             if avg_calories < user.daily_calorie_goal * 0.8:
@@ -265,7 +255,6 @@ class HealthCalculator:
                 recommendations.append("You may be eating more calories than your goal. Consider portion control")
         
         # Nutrition balance recommendations
-        nutrition_summary = HealthCalculator.get_nutrition_summary(user.id, days=7)
         if nutrition_summary['avg_calories'] > 0:
             protein_pct = (nutrition_summary['avg_protein'] * 4) / nutrition_summary['avg_calories'] * 100
             carb_pct = (nutrition_summary['avg_carbs'] * 4) / nutrition_summary['avg_calories'] * 100
@@ -1,11 +1,250 @@
 """
 Health-based recommendation system for recipes and nutrition
 """
+import hashlib
 import json
 import logging
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from keyword_matcher import KeywordMatcher, keyword_matcher
 from models import Recipe, User, db
+from search_engine import SYNC_INTERVAL, recipe_table_state
 from sqlalchemy import and_, or_, not_
 
+# Condition guideline limits and the nutrient column each one caps
+GUIDELINE_COLUMNS = {
+    'max_sugar_per_serving': 'sugar',
+    'max_carbs_per_serving': 'carbs',
+    'max_sodium_per_serving': 'sodium',
+    'max_fat_per_serving': 'fat',
+    'max_protein_per_serving': 'protein',
+    'max_calories_per_serving': 'calories'
+}
+
+# Distinct health profiles whose personalized rankings are kept
+PERSONALIZED_CACHE_SIZE = 256
+
+# Custom keywords (outside the flag vocabulary) whose recipe bitsets each snapshot keeps
+KEYWORD_MASK_CACHE_SIZE = 64
+
+def recipe_text(recipe):
+    """Lowercased name, description, ingredients and tags that health keywords are matched against"""
+    ingredients = ' '.join(str(ingredient) for ingredient in recipe.ingredients or [])
+    tags = ' '.join(str(tag) for tag in recipe.tags or [])
+    return f"{recipe.name} {recipe.description or ''} {ingredients} {tags}".lower()
+
+class KeywordFlags:
+    """Fixed vocabulary of health keywords, each assigned one bit of a recipe's flags"""
+    
+    def __init__(self, keywords):
+        self.keywords = sorted(set(keywords))
+        self.bits = {keyword: i for i, keyword in enumerate(self.keywords)}
+        self.word_count = max(1, (len(self.keywords) + 63) // 64)
+        self.matcher = KeywordMatcher(self.bits)
+    
+    def encode(self, text):
+        """Flags of every vocabulary keyword that appears in the text, found in one pass"""
+        flags = 0
+        for bit in self.matcher.match(text):
+            flags |= 1 << bit
+        return flags
+    
+    def mask(self, keywords):
+        """Flags of the given keywords that are in the vocabulary"""
+        flags = 0
+        for keyword in keywords:
+            bit = self.bits.get(keyword)
+            if bit is not None:
+                flags |= 1 << bit
+        return flags
+    
+    def to_words(self, flags):
+        """Split flags into the 64-bit words stored in the nutrition table"""
+        return [(flags >> (64 * i)) & 0xFFFFFFFFFFFFFFFF for i in range(self.word_count)]
+
+class RecipeNutritionSnapshot:
+    """One build of the nutrition table, whose arrays always line up with each other
+
+    Readers take the current snapshot once and use it for the whole request,
+    so a reload in another thread never mixes arrays of different builds.
+    Each recipe's matches against the health keyword vocabulary are stored
+    in ``flags``, one row of 64-bit words per recipe. Recipe text is not
+    kept: a keyword outside the vocabulary is matched against the recipe
+    table on first use and remembered as a packed bitset.
+    """
+    
+    def __init__(self, keyword_flags, version, ids, columns, flags):
+        self.keyword_flags = keyword_flags
+        self.version = version
+        self.ids = ids
+        self.columns = columns
+        self.flags = flags
+        self._keyword_masks = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def recipe_flags(self, recipe_id):
+        """Keyword flags of one recipe, or None if it is not in the table"""
+        position = np.searchsorted(self.ids, recipe_id)
+        if position == len(self.ids) or self.ids[position] != recipe_id:
+            return None
+        return sum(int(word) << (64 * i) for i, word in enumerate(self.flags[position]))
+    
+    def matches_any(self, flags):
+        """Boolean mask of recipes that share at least one keyword flag"""
+        words = np.array(self.keyword_flags.to_words(flags), dtype=np.uint64)
+        return (self.flags & words).any(axis=1)
+    
+    def contains(self, keyword):
+        """Boolean mask of recipes whose text mentions a keyword outside the flag vocabulary"""
+        with self._lock:
+            bits = self._keyword_masks.get(keyword)
+            if bits is not None:
+                self._keyword_masks.move_to_end(keyword)
+        
+        if bits is None:
+            bits = np.packbits(self.match_keyword(keyword))
+            with self._lock:
+                self._keyword_masks[keyword] = bits
+                while len(self._keyword_masks) > KEYWORD_MASK_CACHE_SIZE:
+                    self._keyword_masks.popitem(last=False)
+        return np.unpackbits(bits, count=len(self.ids)).astype(bool)
+    
+    def match_keyword(self, keyword):
+        """Match a keyword against every recipe's text, streamed from the recipe table"""
+        matcher = keyword_matcher(keyword)
+        mask = np.zeros(len(self.ids), dtype=bool)
+        rows = db.session.query(
+            Recipe.id, Recipe.name, Recipe.description, Recipe.ingredients, Recipe.tags
+        ).yield_per(1000)
+        for row in rows:
+            position = np.searchsorted(self.ids, row.id)
+            # Recipes added since this snapshot was built are not part of it
+            if position < len(self.ids) and self.ids[position] == row.id and matcher.match(recipe_text(row)):
+                mask[position] = True
+        return mask
+    
+    def exceeds(self, column, limit):
+        """Boolean mask of recipes whose nutrient column is above the limit"""
+        return self.columns[column] > limit
+
+class RecipeNutritionTable:
+    """Columnar NumPy copy of every recipe's per-serving nutrients for vectorized filtering
+
+    A reload builds a new RecipeNutritionSnapshot and swaps it in with one
+    assignment, so readers never need a lock.
+    """
+    
+    NUTRIENT_COLUMNS = {
+        'sugar': Recipe.sugar,
+        'carbs': Recipe.carbs,
+        'sodium': Recipe.sodium,
+        'fat': Recipe.fat,
+        'protein': Recipe.protein,
+        'calories': Recipe.calories_per_serving
+    }
+    
+    def __init__(self, keyword_flags):
+        self.keyword_flags = keyword_flags
+        self.checked_at = 0.0
+        self.snapshot = RecipeNutritionSnapshot(
+            keyword_flags, None, np.empty(0, dtype=np.int64),
+            {name: np.empty(0) for name in self.NUTRIENT_COLUMNS},
+            np.zeros((0, keyword_flags.word_count), dtype=np.uint64)
+        )
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self.snapshot)
+    
+    @property
+    def version(self):
+        return self.snapshot.version
+    
+    def current(self):
+        """The up-to-date snapshot, reloading it first if recipes changed"""
+        self.refresh()
+        return self.snapshot
+    
+    def refresh(self, force=False):
+        """Reload the table if recipes changed since it was built, checking at most every SYNC_INTERVAL seconds"""
+        now = time.monotonic()
+        if not force and self.version is not None and now - self.checked_at < SYNC_INTERVAL:
+            return
+        self.checked_at = now
+        
+        version = recipe_table_state()
+        if version == self.version:
+            return
+        
+        with self._lock:
+            rows = db.session.query(
+                Recipe.id, Recipe.name, Recipe.description, Recipe.ingredients, Recipe.tags,
+                *self.NUTRIENT_COLUMNS.values()
+            ).order_by(Recipe.id).all()
+            
+            # Missing nutrients count as 0 so they never exceed a limit, like the scalar checks
+            ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+            columns = {
+                name: np.fromiter((row[5 + i] or 0 for row in rows), dtype=np.float64, count=len(rows))
+                for i, name in enumerate(self.NUTRIENT_COLUMNS)
+            }
+            flags = np.array(
+                [self.keyword_flags.to_words(self.keyword_flags.encode(recipe_text(row))) for row in rows],
+                dtype=np.uint64
+            ).reshape(len(rows), self.keyword_flags.word_count)
+            self.snapshot = RecipeNutritionSnapshot(self.keyword_flags, version, ids, columns, flags)
+            logging.info(f"Recipe nutrition table built for {len(rows)} recipes")
+
+class PersonalizedRecipeCache:
+    """LRU cache of ranked personalized recipe IDs, shared by users with identical health profiles
+
+    Entries remember the nutrition table version they were ranked against,
+    so a catalog change makes every entry stale without walking the cache.
+    A profile edit changes the user's key, and the old entry ages out.
+    """
+    
+    def __init__(self, max_entries=PERSONALIZED_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def get(self, key, version, limit):
+        """Cached ranking for a profile key, or None if missing, stale or too short for the limit"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+    
+            entry_version, entry_limit, recipe_ids = entry
+            if entry_version != version:
+                del self._entries[key]
+                return None
+            if entry_limit < limit:
+                return None
+    
+            self._entries.move_to_end(key)
+            return recipe_ids[:limit]
+    
+    def put(self, key, version, limit, recipe_ids):
+        """Store a ranking, evicting the least recently used profile when full"""
+        with self._lock:
+            self._entries[key] = (version, limit, list(recipe_ids))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
 class HealthRecommendationEngine:
     """Generate personalized recommendations based on health conditions"""
     
@@ -59,30 +298,35 @@ class HealthRecommendationEngine:
             }
         }
         
+        # Ingredients excluded by keyword-based dietary restrictions
+        self.restriction_keywords = {
+            'vegetarian': ['chicken', 'beef', 'pork', 'fish', 'turkey', 'lamb', 'seafood', 'meat'],
+            'vegan': ['chicken', 'beef', 'pork', 'fish', 'turkey', 'lamb', 'seafood', 'meat',
+                      'dairy', 'milk', 'cheese', 'butter', 'cream', 'egg', 'honey'],
+            'halal': ['pork', 'ham', 'bacon', 'alcohol', 'wine', 'beer'],
+            'kosher': ['pork', 'ham', 'bacon', 'shellfish', 'lobster', 'crab', 'shrimp']
+        }
+        
+        # Per-serving nutrient caps of threshold-based dietary restrictions
+        self.restriction_limits = {
+            'keto': {'carbs': 10},
+            'ketogenic': {'carbs': 10},
+            'low-sodium': {'sodium': 500},
+            'low-carb': {'carbs': 20}
+        }
+        
+        vocabulary = [keyword for keywords in self.allergen_keywords.values() for keyword in keywords]
+        vocabulary += [keyword for keywords in self.restriction_keywords.values() for keyword in keywords]
+        self.keyword_flags = KeywordFlags(vocabulary)
+        self.nutrition_table = RecipeNutritionTable(self.keyword_flags)
+        self.personalized_cache = PersonalizedRecipeCache()
+        
     def get_user_health_data(self, user):
         """Extract and parse user health information"""
-        allergies = []
-        conditions = []
-        restrictions = []
+        allergies = user.allergies or []
+        conditions = user.medical_conditions or []
+        restrictions = user.dietary_restrictions or []
         
-        try:
-            if user.allergies:
-                allergies = json.loads(user.allergies)
-        except:
-            pass
-            
-        try:
-            if user.medical_conditions:
-                conditions = json.loads(user.medical_conditions)
-        except:
-            pass
-            
-        try:
-            if user.dietary_restrictions:
-                restrictions = json.loads(user.dietary_restrictions)
-        except:
-            pass
-            
         return {
             'allergies': [a.lower().strip() for a in allergies],
             'conditions': [c.lower().strip() for c in conditions],
@@ -94,19 +338,38 @@ class HealthRecommendationEngine:
         if not allergies:
             return True
             
-        # Get recipe ingredients and tags
-        recipe_text = f"{recipe.name} {recipe.description or ''} {recipe.ingredients or ''} {recipe.tags or ''}".lower()
+        return not self.find_allergens(recipe, allergies)
+    
+    def get_recipe_flags(self, recipe):
+        """Precomputed keyword flags of a recipe, encoding its text only if it is not in the table yet"""
+        flags = self.nutrition_table.current().recipe_flags(recipe.id)
+        if flags is None:
+            flags = self.keyword_flags.encode(recipe_text(recipe))
+        return flags
+    
+    def has_keywords(self, recipe, keywords, flags):
+        """Check whether any keyword appears in the recipe, using flags where possible"""
+        if flags & self.keyword_flags.mask(keywords):
+            return True
         
-        for allergy in allergies:
-            # Get keywords for this allergy
-            keywords = self.allergen_keywords.get(allergy, [allergy])
-            
-            # Check if any allergen keywords appear in recipe
-            for keyword in keywords:
-                if keyword in recipe_text:
-                    return False
-                    
-        return True
+        # Keywords outside the vocabulary (e.g. a custom allergy) still need the text
+        unknown = [keyword for keyword in keywords if keyword not in self.keyword_flags.bits]
+        if unknown:
+            text = recipe_text(recipe)
+            return any(keyword_matcher(keyword).match(text) for keyword in unknown)
+        return False
+    
+    def find_allergens(self, recipe, allergies, flags=None):
+        """Allergies whose keywords appear in the recipe"""
+        if not allergies:
+            return []
+        if flags is None:
+            flags = self.get_recipe_flags(recipe)
+        
+        return [
+            allergy for allergy in allergies
+            if self.has_keywords(recipe, self.allergen_keywords.get(allergy, [allergy]), flags)
+        ]
     
     def is_recipe_suitable_for_conditions(self, recipe, conditions):
         """Check if recipe meets dietary requirements for medical conditions"""
@@ -150,76 +413,112 @@ class HealthRecommendationEngine:
         if not restrictions:
             return True
             
-        recipe_text = f"{recipe.name} {recipe.description or ''} {recipe.ingredients or ''} {recipe.tags or ''}".lower()
+        flags = self.get_recipe_flags(recipe)
         
         for restriction in restrictions:
-            if restriction == 'vegetarian':
-                meat_keywords = ['chicken', 'beef', 'pork', 'fish', 'turkey', 'lamb', 'seafood', 'meat']
-                if any(keyword in recipe_text for keyword in meat_keywords):
-                    return False
-                    
-            elif restriction == 'vegan':
-                animal_keywords = ['chicken', 'beef', 'pork', 'fish', 'turkey', 'lamb', 'seafood', 'meat', 
-                                 'dairy', 'milk', 'cheese', 'butter', 'cream', 'egg', 'honey']
-                if any(keyword in recipe_text for keyword in animal_keywords):
-                    return False
-                    
-            elif restriction == 'halal':
-                haram_keywords = ['pork', 'ham', 'bacon', 'alcohol', 'wine', 'beer']
-                if any(keyword in recipe_text for keyword in haram_keywords):
-                    return False
-                    
-            elif restriction == 'kosher':
-                non_kosher_keywords = ['pork', 'ham', 'bacon', 'shellfish', 'lobster', 'crab', 'shrimp']
-                if any(keyword in recipe_text for keyword in non_kosher_keywords):
-                    return False
-                    
-            elif restriction in ['keto', 'ketogenic']:
-                if recipe.carbs and recipe.carbs > 10:
-                    return False
-                    
-            elif restriction == 'low-sodium':
-                if recipe.sodium and recipe.sodium > 500:
-                    return False
-                    
-            elif restriction == 'low-carb':
-                if recipe.carbs and recipe.carbs > 20:
+            keywords = self.restriction_keywords.get(restriction, [])
+            if self.has_keywords(recipe, keywords, flags):
+                return False
+            
+            limits = {
+                'carbs': recipe.carbs,
+                'sodium': recipe.sodium
+            }
+            for column, limit in self.restriction_limits.get(restriction, {}).items():
+                if limits[column] and limits[column] > limit:
                     return False
                     
         return True
     
-    def get_personalized_recipes(self, user, limit=20):
-        """Get recipes personalized for user's health conditions"""
-        health_data = self.get_user_health_data(user)
+    def eligibility_mask(self, health_data, table=None):
+        """Boolean mask over a nutrition table snapshot of recipes safe for the user's health data"""
+        if table is None:
+            table = self.nutrition_table.current()
+        mask = np.ones(len(table), dtype=bool)
         
-        # Get all recipes
-        all_recipes = Recipe.query.all()
-        safe_recipes = []
+        # Gather every excluded keyword so known ones cost a single AND/NOT over the flags
+        keywords = []
+        for allergy in health_data['allergies']:
+            keywords.extend(self.allergen_keywords.get(allergy, [allergy]))
+        for restriction in health_data['restrictions']:
+            keywords.extend(self.restriction_keywords.get(restriction, []))
         
-        for recipe in all_recipes:
-            # Check allergies
-            if not self.is_recipe_safe_for_allergies(recipe, health_data['allergies']):
-                continue
-                
-            # Check medical conditions
-            if not self.is_recipe_suitable_for_conditions(recipe, health_data['conditions']):
-                continue
-                
-            # Check dietary restrictions
-            if not self.is_recipe_compatible_with_restrictions(recipe, health_data['restrictions']):
-                continue
-                
-            safe_recipes.append(recipe)
+        mask &= ~table.matches_any(self.keyword_flags.mask(keywords))
+        for keyword in keywords:
+            if keyword not in self.keyword_flags.bits:
+                mask &= ~table.contains(keyword)
         
-        # Sort by nutritional suitability for user's goals
-        if user.goal == 'lose':
-            safe_recipes.sort(key=lambda r: (r.calories_per_serving or 999, r.fat or 999))
-        elif user.goal == 'gain':
-            safe_recipes.sort(key=lambda r: -(r.calories_per_serving or 0))
+        # Check medical conditions
+        for condition in health_data['conditions']:
+            guidelines = self.condition_guidelines.get(condition, {})
+            for key, column in GUIDELINE_COLUMNS.items():
+                if key in guidelines:
+                    mask &= ~table.exceeds(column, guidelines[key])
+        
+        # Check dietary restriction thresholds
+        for restriction in health_data['restrictions']:
+            for column, limit in self.restriction_limits.get(restriction, {}).items():
+                mask &= ~table.exceeds(column, limit)
+        
+        return mask
+    
+    def rank_by_goal(self, goal, candidates, limit, table):
+        """Positions of the best candidates in a nutrition table snapshot for the user's goal, best first"""
+        calories = table.columns['calories'][candidates]
+        
+        # Sort keys match the scalar ones: a missing value counts as 999, 0 or 400
+        if goal == 'lose':
+            fat = table.columns['fat'][candidates]
+            keys = [np.where(fat == 0, 999, fat), np.where(calories == 0, 999, calories)]
+        elif goal == 'gain':
+            keys = [-calories]
         else:  # maintain
-            safe_recipes.sort(key=lambda r: abs((r.calories_per_serving or 400) - 400))
-            
-        return safe_recipes[:limit]
+            keys = [np.abs(np.where(calories == 0, 400, calories) - 400)]
+        
+        # Partition on the primary key to drop everything past the limit, keeping ties
+        primary = keys[-1]
+        if limit < len(primary):
+            cutoff = np.partition(primary, limit - 1)[limit - 1]
+            keep = np.flatnonzero(primary <= cutoff)
+            candidates = candidates[keep]
+            keys = [key[keep] for key in keys]
+        
+        order = np.lexsort(keys)[:limit]
+        return candidates[order]
+    
+    def profile_key(self, user):
+        """Hash of the health profile fields that personalized recommendations depend on"""
+        health_data = self.get_user_health_data(user)
+        profile = [sorted(set(health_data[field])) for field in ('allergies', 'conditions', 'restrictions')]
+        profile.append(user.goal or '')
+        return hashlib.sha1(json.dumps(profile).encode('utf-8')).hexdigest()
+    
+    def get_personalized_recipe_ids(self, user, limit=20):
+        """Ranked IDs of recipes personalized for user's health conditions, cached per health profile"""
+        table = self.nutrition_table.current()
+        key = self.profile_key(user)
+        recipe_ids = self.personalized_cache.get(key, table.version, limit)
+        if recipe_ids is not None:
+            return recipe_ids
+        
+        health_data = self.get_user_health_data(user)
+        candidates = np.flatnonzero(self.eligibility_mask(health_data, table))
+        
+        # Sort by nutritional suitability for user's goals
+        positions = self.rank_by_goal(user.goal, candidates, limit, table)
+        recipe_ids = [int(recipe_id) for recipe_id in table.ids[positions]]
+        self.personalized_cache.put(key, table.version, limit, recipe_ids)
+        return recipe_ids
+    
+    def get_personalized_recipes(self, user, limit=20):
+        """Get recipes personalized for user's health conditions"""
+        recipe_ids = self.get_personalized_recipe_ids(user, limit)
+        if not recipe_ids:
+            return []
+        
+        recipes = Recipe.query.filter(Recipe.id.in_(recipe_ids)).all()
+        recipes_by_id = {recipe.id: recipe for recipe in recipes}
+        return [recipes_by_id[recipe_id] for recipe_id in recipe_ids if recipe_id in recipes_by_id]
     
     def get_health_warnings(self, recipe, user):
         """Get warnings for a recipe based on user's health conditions"""
@@ -227,17 +526,9 @@ class HealthRecommendationEngine:
         warnings = []
         
         # Check allergies
-        if not self.is_recipe_safe_for_allergies(recipe, health_data['allergies']):
-            allergens_found = []
-            recipe_text = f"{recipe.name} {recipe.description or ''} {recipe.ingredients or ''} {recipe.tags or ''}".lower()
-            
-            for allergy in health_data['allergies']:
-                keywords = self.allergen_keywords.get(allergy, [allergy])
-                if any(keyword in recipe_text for keyword in keywords):
-                    allergens_found.append(allergy.title())
-                    
-            if allergens_found:
-                warnings.append(f"⚠️ Contains allergens: {', '.join(allergens_found)}")
+        allergens_found = self.find_allergens(recipe, health_data['allergies'])
+        if allergens_found:
+            warnings.append(f"⚠️ Contains allergens: {', '.join(allergy.title() for allergy in allergens_found)}")
         
         # Check medical conditions
         for condition in health_data['conditions']:
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Serve food classifier predictions to the web workers on this host
+Loads the model once and answers over a Unix socket, batching images from
+concurrent connections into single predict calls. Point the app at it with
+INFERENCE_SOCKET so workers never load TensorFlow themselves
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import socketserver
+import sys
+import numpy as np
+from ml_model import INFERENCE_BACKENDS, INPUT_SHAPE, FoodClassifier, PredictionBatcher, recv_message, send_message
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class InferenceRequestHandler(socketserver.BaseRequestHandler):
+    """Answer each request on a connection with the predictions for its images"""
+
+    def handle(self):
+        while True:
+            try:
+                payload = recv_message(self.request)
+            except ConnectionError as e:
+                logger.warning(f"Dropped inference connection: {e}")
+                return
+            if payload is None:
+                return
+
+            try:
+                arrays = np.frombuffer(payload, dtype='<f4').reshape((-1, 1) + INPUT_SHAPE)
+            except ValueError:
+                logger.error(f"Inference request of {len(payload)} bytes is not a whole number of images")
+                return
+
+            futures = [self.server.batcher.submit_array(array) for array in arrays]
+            send_message(self.request, json.dumps([future.result() for future in futures]).encode('utf-8'))
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, classifier):
+        self.batcher = PredictionBatcher(classifier)
+        super().__init__(socket_path, InferenceRequestHandler)
+
+def serve(socket_path, backend='keras', backend_path=None):
+    """Load the model and serve predictions until interrupted"""
+    classifier = FoodClassifier(backend=backend, backend_path=backend_path)
+    if not classifier.ensure_loaded():
+        logger.warning("⚠️ No model available, serving mock predictions")
+
+    # A socket file left by a previous run would make bind fail
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+
+    with InferenceServer(socket_path, classifier) as server:
+        os.chmod(socket_path, 0o660)
+        logger.info(f"🧠 Serving food classifier predictions on {socket_path}")
+        # Stop cleanly under process managers, which send SIGTERM
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(socket_path)
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Serve food classifier predictions over a Unix socket')
+    parser.add_argument('--socket', default=os.environ.get('INFERENCE_SOCKET', 'instance/inference.sock'),
+                        help='Unix socket path to listen on')
+    parser.add_argument('--backend', default=os.environ.get('ML_BACKEND', 'keras'),
+                        choices=['keras'] + sorted(INFERENCE_BACKENDS), help='Runtime serving the model')
+    parser.add_argument('--model', default=os.environ.get('ML_BACKEND_PATH'),
+                        help='Exported model path (default: next to the Keras model)')
+    args = parser.parse_args()
+
+    serve(args.socket, args.backend, args.model)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Multi-pattern keyword matching for health checks on recipe text
+"""
+import re
+from functools import lru_cache
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+# Compound and derived words that contain the health keyword they start or end with;
+# every other word only matches a keyword as a whole, so 'hamburger' is not 'ham'
+COMPOUND_WORDS = frozenset({
+    # Fish and shellfish
+    'catfish', 'codfish', 'monkfish', 'swordfish', 'fishcake', 'fishball', 'fishstick',
+    'crabcake', 'crabmeat',
+    # Dairy
+    'buttercream', 'buttermilk', 'butterscotch', 'cheeseburger', 'cheesecake', 'cheesesteak',
+    'creamcheese', 'creamy', 'icecream', 'milkshake', 'sourcream',
+    # Eggs
+    'eggnog', 'eggroll', 'eggwash',
+    # Wheat and gluten
+    'breadcrumb', 'breaded', 'breadstick', 'cornbread', 'flatbread', 'gingerbread', 'shortbread',
+    # Soy and nuts
+    'soybean', 'soymilk', 'almondmilk', 'peanutbutter',
+    # Meat
+    'meatball', 'meatloaf', 'mincemeat', 'porkchop', 'hamhock',
+    'honeycomb'
+})
+
+def normalize_token(token):
+    """Fold a plural onto its singular so 'eggs' matches 'egg', 'berries' 'berry' and 'tomatoes' 'tomato'"""
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 4 and token.endswith('oes'):
+        return token[:-2]
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+def tokenize(text):
+    """Lowercased, plural-folded word tokens of a text"""
+    return [normalize_token(token) for token in TOKEN_PATTERN.findall(text.lower())]
+
+class KeywordMatcher:
+    """Trie of keyword tokens that finds every keyword in one pass over a text
+
+    Keywords match whole words, plus the compounds in COMPOUND_WORDS that
+    start or end with them, so 'catfish', 'cornbread' and 'cheeseburger'
+    are caught while 'hamburger' and 'butternut' are not. Keywords may span
+    several words, e.g. 'brazil nut'. Each keyword maps to one or more
+    labels, and ``match`` reports every label whose keyword occurs.
+    """
+
+    def __init__(self, patterns):
+        """
+        Args:
+            patterns: Mapping of keyword to a label or an iterable of labels
+        """
+        self.goto = [{}]
+        self.outputs = [set()]
+        self.vocabulary = set()
+
+        for keyword, labels in patterns.items():
+            if not isinstance(labels, (list, tuple, set, frozenset)):
+                labels = [labels]
+            self._add(tokenize(keyword), labels)
+
+        self.min_length = min((len(token) for token in self.vocabulary), default=0)
+
+    def _add(self, tokens, labels):
+        """Add a keyword's token path to the trie"""
+        if not tokens:
+            return
+
+        state = 0
+        for token in tokens:
+            next_state = self.goto[state].get(token)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][token] = next_state
+                self.goto.append({})
+                self.outputs.append(set())
+            state = next_state
+        self.outputs[state].update(labels)
+        self.vocabulary.update(tokens)
+
+    def symbols(self, token):
+        """Keyword tokens that a text token is, or that a known compound starts or ends with"""
+        vocabulary = self.vocabulary
+        if token not in COMPOUND_WORDS:
+            return [token] if token in vocabulary else []
+
+        found = []
+        for length in range(self.min_length, len(token) + 1):
+            prefix = token[:length]
+            if prefix in vocabulary:
+                found.append(prefix)
+            suffix = token[-length:]
+            if suffix != prefix and suffix in vocabulary:
+                found.append(suffix)
+        return found
+
+    def match(self, text):
+        """Labels of every keyword that occurs in the text"""
+        goto = self.goto
+        outputs = self.outputs
+
+        found = set()
+        # Trie states reached by keywords that are still being matched across words
+        active = []
+        for token in tokenize(text):
+            symbols = self.symbols(token)
+            if not symbols:
+                active = []
+                continue
+
+            reached = []
+            for state in (0, *active):
+                transitions = goto[state]
+                for symbol in symbols:
+                    next_state = transitions.get(symbol)
+                    if next_state is not None:
+                        reached.append(next_state)
+                        found |= outputs[next_state]
+            active = reached
+        return found
+
+@lru_cache(maxsize=256)
+def keyword_matcher(keyword):
+    """Matcher for a single ad-hoc keyword, such as a custom allergy"""
+    return KeywordMatcher({keyword: keyword})
@@ -4,7 +4,6 @@ Load comprehensive recipe database with 200+ recipes
 Run this to populate the database with a full recipe collection
 """
 
-import json
 import logging
 from app import app, db
 from models import Recipe, FoodCategory
@@ -325,7 +324,7 @@ def load_all_recipes():
                 recipe = Recipe(
                     name=recipe_data["name"],
                     description=recipe_data["description"],
-                    ingredients=json.dumps(recipe_data["ingredients"]),
+                    ingredients=recipe_data["ingredients"],
                     instructions=recipe_data["instructions"],
                     prep_time=recipe_data["prep_time"],
                     cook_time=recipe_data["cook_time"],
@@ -338,7 +337,7 @@ def load_all_recipes():
                     sugar=recipe_data["sugar"],
                     sodium=recipe_data["sodium"],
                     category=recipe_data["category"],
-                    tags=json.dumps(recipe_data["tags"])
+                    tags=recipe_data["tags"]
                 )
                 db.session.add(recipe)
             
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Create the indexes declared on the models in an existing database
+db.create_all() only indexes tables it creates, so databases from before an
+index was added need this once. With --check it also EXPLAINs the hot
+queries and fails if any of them falls back to a sequential scan
+"""
+
+import argparse
+import logging
+import sys
+from datetime import date, timedelta
+from sqlalchemy import select, text
+from app import app, db
+from models import DailyNutrition, FoodLog, Recipe
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def hot_queries(dialect):
+    """The frequent filters that must be answered from an index, by name"""
+    today = date.today()
+    queries = {
+        'food log for one day': select(FoodLog.food_name, FoodLog.calories, FoodLog.servings).where(
+            FoodLog.user_id == 1, FoodLog.date_logged == today),
+        'food log for a week': select(FoodLog.calories, FoodLog.servings).where(
+            FoodLog.user_id == 1, FoodLog.date_logged.between(today - timedelta(days=6), today)),
+        'daily nutrition for a week': select(DailyNutrition.calories).where(
+            DailyNutrition.user_id == 1, DailyNutrition.date.between(today - timedelta(days=6), today)),
+        'recipes by category': select(Recipe.id).where(Recipe.category == 'Main Course'),
+        'recipes by food category': select(Recipe.id).where(Recipe.food_category_id == 1),
+        'recipe by name': select(Recipe.id).where(Recipe.name == 'Margherita Pizza')
+    }
+
+    # Only PostgreSQL can index a leading-wildcard match, through pg_trgm
+    if dialect == 'postgresql':
+        queries['recipes by name substring'] = select(Recipe.id).where(Recipe.name.ilike('%pizza%'))
+
+    return queries
+
+def explain(connection, statement):
+    """Query plan lines of a statement in the connection's dialect"""
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True}))
+    if connection.dialect.name == 'sqlite':
+        return [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+    return [row[0] for row in connection.exec_driver_sql(f"EXPLAIN {sql}")]
+
+def is_sequential_scan(dialect, line):
+    """Whether a plan line reads a whole table"""
+    if dialect == 'sqlite':
+        return line.startswith('SCAN ')
+    return 'Seq Scan' in line
+
+def create_indexes():
+    """Create any declared index that is missing from the database"""
+    with app.app_context():
+        try:
+            with db.engine.begin() as connection:
+                if connection.dialect.name == 'postgresql':
+                    connection.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+                db.metadata.create_all(connection)
+                for table in db.metadata.sorted_tables:
+                    for index in sorted(table.indexes, key=lambda index: index.name):
+                        index.create(connection, checkfirst=True)
+
+            logger.info("✅ Indexes are up to date")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error creating indexes: {e}")
+            return False
+
+def check_query_plans():
+    """EXPLAIN every hot query, returning the names of those that scan a whole table"""
+    failures = []
+    with app.app_context():
+        with db.engine.connect() as connection:
+            dialect = connection.dialect.name
+            if dialect == 'postgresql':
+                # Tiny tables are cheaper to scan, so make the planner pick an index whenever one applies
+                connection.execute(text('SET LOCAL enable_seqscan = off'))
+
+            for name, statement in hot_queries(dialect).items():
+                plan = explain(connection, statement)
+                if any(is_sequential_scan(dialect, line) for line in plan):
+                    logger.error(f"❌ {name} uses a sequential scan: {' | '.join(plan)}")
+                    failures.append(name)
+                else:
+                    logger.info(f"✅ {name}: {' | '.join(plan)}")
+
+            connection.rollback()
+
+    return failures
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Create missing database indexes')
+    parser.add_argument('--check', action='store_true', help='Fail if a hot query plan contains a sequential scan')
+    args = parser.parse_args()
+
+    logger.info("🗂️ Creating database indexes")
+    if not create_indexes():
+        logger.error("💥 Index migration failed!")
+        sys.exit(1)
+
+    if args.check and check_query_plans():
+        logger.error("💥 Hot queries are not using indexes!")
+        sys.exit(1)
+
+    logger.info("🎉 Index migration complete!")
+
+if __name__ == "__main__":
+    main()
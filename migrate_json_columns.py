@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Convert the JSON text columns of an existing database to native JSON
+Recipe ingredients and tags and the user health lists used to be stored as
+json.dumps() text. On PostgreSQL the columns become JSONB; on SQLite the
+values are rewritten as JSON. The recipe_ingredient table is rebuilt too.
+Every recipe is logged as changed and the saved search index is deleted, since
+both may have been built from the unconverted text; restart the web workers
+afterwards so none keeps serving its old in-memory copy
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+from sqlalchemy import Text, bindparam, cast, inspect, select, update
+from sqlalchemy.dialects.postgresql import JSONB
+from app import app, db
+from models import Recipe, RecipeChange, RecipeIngredient, User, ingredient_words
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JSON_COLUMNS = {
+    Recipe.__table__: ['ingredients', 'tags'],
+    User.__table__: ['allergies', 'medical_conditions', 'dietary_restrictions']
+}
+
+def parse_legacy_list(value):
+    """A list from stored JSON text, falling back to comma-separated text"""
+    if value is None:
+        return None
+    try:
+        parsed = json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return [part.strip() for part in value.split(',') if part.strip()]
+    if parsed is None or isinstance(parsed, list):
+        return parsed
+    return [parsed]
+
+def convert_table(connection, table, columns):
+    """Rewrite one table's list columns as native JSON, returning the parsed rows"""
+    rows = connection.execute(
+        select(table.c.id, *[cast(table.c[column], Text) for column in columns])
+    ).all()
+    parsed = [
+        {'row_id': row[0], **{column: parse_legacy_list(value) for column, value in zip(columns, row[1:])}}
+        for row in rows
+    ]
+
+    if connection.dialect.name == 'postgresql':
+        reflected = {column['name']: column['type'] for column in inspect(connection).get_columns(table.name)}
+        table_name = connection.dialect.identifier_preparer.format_table(table)
+        for column in columns:
+            if not isinstance(reflected[column], JSONB):
+                # Every text value is valid as a JSON string; the real lists are written below
+                connection.exec_driver_sql(
+                    f"ALTER TABLE {table_name} ALTER COLUMN {column} TYPE JSONB USING to_jsonb({column})"
+                )
+
+    if parsed:
+        statement = update(table).where(table.c.id == bindparam('row_id')).values(
+            {column: bindparam(column) for column in columns}
+        )
+        connection.execute(statement, parsed)
+
+    logger.info(f"Converted {len(parsed)} {table.name} rows")
+    return parsed
+
+def log_recipe_changes(connection, recipes):
+    """Log every converted recipe as changed so running workers re-read it into their search index"""
+    if recipes:
+        connection.execute(
+            RecipeChange.__table__.insert(),
+            [{'recipe_id': recipe['row_id'], 'created_at': datetime.utcnow()} for recipe in recipes]
+        )
+
+def remove_search_index(path):
+    """Delete the saved search index, which may hold terms read from the unconverted text"""
+    if os.path.exists(path):
+        os.remove(path)
+        logger.info(f"Removed stale search index {path}; workers rebuild it on start")
+
+def migrate_json_columns():
+    """Convert every list column, rebuild the recipe ingredient index and invalidate derived recipe state"""
+    with app.app_context():
+        try:
+            with db.engine.begin() as connection:
+                db.metadata.create_all(connection)
+
+                recipes = []
+                for table, columns in JSON_COLUMNS.items():
+                    rows = convert_table(connection, table, columns)
+                    if table is Recipe.__table__:
+                        recipes = rows
+
+                connection.execute(RecipeIngredient.__table__.delete())
+                ingredient_rows = [
+                    {'recipe_id': recipe['row_id'], 'name': word}
+                    for recipe in recipes
+                    for word in ingredient_words(recipe['ingredients'])
+                ]
+                if ingredient_rows:
+                    connection.execute(RecipeIngredient.__table__.insert(), ingredient_rows)
+                logger.info(f"Indexed {len(ingredient_rows)} recipe ingredient words")
+
+                # Moves the catalog version, so nutrition tables and category maps rebuild too
+                log_recipe_changes(connection, recipes)
+
+            remove_search_index(app.config['SEARCH_INDEX_PATH'])
+            logger.info("✅ JSON columns migrated")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error migrating JSON columns: {e}")
+            return False
+
+def main():
+    """Main function"""
+    logger.info("🔄 Migrating JSON text columns")
+    if migrate_json_columns():
+        logger.info("🎉 JSON column migration complete!")
+        logger.warning("⚠️ Restart the web workers so they drop recipe data read before the migration")
+    else:
+        logger.error("💥 JSON column migration failed!")
+
+if __name__ == "__main__":
+    main()
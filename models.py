@@ -2,6 +2,14 @@ from app import db
 from flask_login import UserMixin
 from datetime import datetime, date
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import DDL, and_, event, false, func, insert, inspect, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from keyword_matcher import tokenize
+
+# Lists stored as native JSON: JSONB on PostgreSQL, JSON text on SQLite
+JSONList = db.JSON().with_variant(JSONB(), 'postgresql')
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -20,12 +28,13 @@ class User(UserMixin, db.Model):
     daily_calorie_goal = db.Column(db.Integer)
     
     # Health conditions and preferences
-    allergies = db.Column(db.Text)  # JSON string of allergies
-    medical_conditions = db.Column(db.Text)  # JSON string of medical conditions
-    dietary_restrictions = db.Column(db.Text)  # JSON string of dietary restrictions
+    allergies = db.Column(JSONList)  # list of allergies
+    medical_conditions = db.Column(JSONList)  # list of medical conditions
+    dietary_restrictions = db.Column(JSONList)  # list of dietary restrictions
     
     # Relationships
     food_logs = db.relationship('FoodLog', backref='user', lazy=True, cascade='all, delete-orphan')
+    daily_nutrition = db.relationship('DailyNutrition', backref='user', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -71,10 +80,16 @@ class User(UserMixin, db.Model):
         return int(daily_calories)
 
 class Recipe(db.Model):
+    __table_args__ = (
+        # Trigram index for substring name lookups such as ilike('%pizza%'), PostgreSQL only
+        db.Index('ix_recipe_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(200), nullable=False)
+    name = db.Column(db.String(200), nullable=False, index=True)
     description = db.Column(db.Text)
-    ingredients = db.Column(db.Text, nullable=False)  # JSON string
+    ingredients = db.Column(JSONList, nullable=False)  # list of ingredient lines
     instructions = db.Column(db.Text, nullable=False)
     prep_time = db.Column(db.Integer)  # in minutes
     cook_time = db.Column(db.Integer)  # in minutes
@@ -86,13 +101,67 @@ class Recipe(db.Model):
     fiber = db.Column(db.Float)    # grams per serving
     sugar = db.Column(db.Float)    # grams per serving
     sodium = db.Column(db.Float)   # mg per serving
-    category = db.Column(db.String(100))
-    tags = db.Column(db.Text)      # JSON string of tags
-    food_category_id = db.Column(db.Integer)  # Food-101 category ID
+    category = db.Column(db.String(100), index=True)
+    tags = db.Column(JSONList)     # list of tags
+    food_category_id = db.Column(db.Integer, index=True)  # Food-101 category ID
     image_path = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    indexed_ingredients = db.relationship('RecipeIngredient', backref='recipe', lazy=True, cascade='all, delete-orphan')
+    
+    @classmethod
+    def with_ingredient(cls, name):
+        """Query of recipes with an ingredient word starting with each word of name, from the recipe_ingredient index
+
+        A range scan on the indexed name column finds the prefix matches, so
+        'chick' finds chicken and 'berry' finds berries.
+        """
+        words = tokenize(name)
+        if not words:
+            return cls.query.filter(false())
+        query = cls.query
+        for word in words:
+            # Without a final 'y' the prefix also covers words stored before '-ies' plurals were folded
+            prefix = word[:-1] if len(word) > 3 and word.endswith('y') else word
+            query = query.filter(cls.indexed_ingredients.any(and_(
+                RecipeIngredient.name >= prefix, RecipeIngredient.name < prefix + '\U0010ffff'
+            )))
+        return query
+
+# The trigram operator class comes from the pg_trgm extension
+event.listen(Recipe.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+def ingredient_words(ingredients):
+    """Distinct normalized words of a recipe's ingredient lines, skipping quantities"""
+    words = set()
+    for ingredient in ingredients or []:
+        if isinstance(ingredient, dict):
+            ingredient = ingredient.get('name', '')
+        words.update(word for word in tokenize(str(ingredient)) if not word.isdigit())
+    return sorted(words)
+
+class RecipeIngredient(db.Model):
+    """One normalized ingredient word of a recipe, so ingredient lookups can use an index"""
+    id = db.Column(db.Integer, primary_key=True)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'), nullable=False, index=True)
+    name = db.Column(db.String(100), nullable=False, index=True)
+
+@event.listens_for(Session, 'before_flush')
+def _sync_recipe_ingredients(session, flush_context, instances):
+    """Rewrite a recipe's ingredient rows whenever its ingredient list is added or changed"""
+    for recipe in list(session.new) + list(session.dirty):
+        if isinstance(recipe, Recipe) and inspect(recipe).attrs.ingredients.history.has_changes():
+            recipe.indexed_ingredients = [RecipeIngredient(name=word) for word in ingredient_words(recipe.ingredients)]
 
 class FoodLog(db.Model):
+    __table_args__ = (
+        # Every dashboard, summary and email query filters one user's logs by day;
+        # on PostgreSQL the nutrient columns are included so totals read only the index
+        db.Index('ix_food_log_user_date', 'user_id', 'date_logged',
+                 postgresql_include=['calories', 'servings', 'protein', 'carbs', 'fat']),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'))
@@ -108,9 +177,92 @@ class FoodLog(db.Model):
     
     recipe = db.relationship('Recipe', backref='food_logs')
 
+class DailyNutrition(db.Model):
+    """Per-day totals of a user's food logs, kept in step with FoodLog so summaries read one row per day"""
+    __table_args__ = (db.UniqueConstraint('user_id', 'date'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    calories = db.Column(db.Float, default=0)
+    protein = db.Column(db.Float, default=0)
+    carbs = db.Column(db.Float, default=0)
+    fat = db.Column(db.Float, default=0)
+    meals = db.Column(db.Integer, default=0)
+    
+    @classmethod
+    def record(cls, food_log):
+        """Add a food log entry to its day's totals in the current transaction"""
+        servings = food_log.servings if food_log.servings is not None else 1.0
+        day = food_log.date_logged or date.today()
+        amounts = {
+            'calories': food_log.calories * servings,
+            'protein': (food_log.protein or 0) * servings,
+            'carbs': (food_log.carbs or 0) * servings,
+            'fat': (food_log.fat or 0) * servings
+        }
+        
+        # Increment in SQL so concurrent logs for the same day don't overwrite each other
+        increment = update(cls).where(cls.user_id == food_log.user_id, cls.date == day).values(
+            meals=cls.meals + 1,
+            **{name: getattr(cls, name) + amount for name, amount in amounts.items()}
+        )
+        if db.session.execute(increment).rowcount:
+            return
+        
+        try:
+            with db.session.begin_nested():
+                db.session.add(cls(user_id=food_log.user_id, date=day, meals=1, **amounts))
+        except IntegrityError:
+            # Another request created the day's row first
+            db.session.execute(increment)
+    
+    @classmethod
+    def rebuild(cls, user_id=None):
+        """Recompute totals from the raw food logs, for every user or just one
+
+        Returns:
+            Number of daily rows written
+        """
+        logs = FoodLog.query.filter(FoodLog.date_logged.isnot(None))
+        rollups = cls.query
+        if user_id is not None:
+            logs = logs.filter(FoodLog.user_id == user_id)
+            rollups = rollups.filter(cls.user_id == user_id)
+        
+        totals = logs.with_entities(
+            FoodLog.user_id,
+            FoodLog.date_logged,
+            func.coalesce(func.sum(FoodLog.calories * FoodLog.servings), 0),
+            func.coalesce(func.sum(FoodLog.protein * FoodLog.servings), 0),
+            func.coalesce(func.sum(FoodLog.carbs * FoodLog.servings), 0),
+            func.coalesce(func.sum(FoodLog.fat * FoodLog.servings), 0),
+            func.count(FoodLog.id)
+        ).group_by(FoodLog.user_id, FoodLog.date_logged)
+        
+        rollups.delete(synchronize_session=False)
+        columns = [cls.user_id, cls.date, cls.calories, cls.protein, cls.carbs, cls.fat, cls.meals]
+        return db.session.execute(insert(cls).from_select(columns, totals.statement)).rowcount
+
+class DigestDelivery(db.Model):
+    """A summary email already sent to a user for a day, so digest runs can resume without resending"""
+    __table_args__ = (db.UniqueConstraint('kind', 'period', 'user_id'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # 'daily' or 'weekly'
+    period = db.Column(db.Date, nullable=False)  # the day summarized, or the last day of the week
+    sent_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class FoodCategory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     category_id = db.Column(db.Integer, unique=True, nullable=False)  # Food-101 category ID
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class RecipeChange(db.Model):
+    """Log of recipe writes that lets every worker bring its search index up to date"""
+    id = db.Column(db.Integer, primary_key=True)
+    recipe_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
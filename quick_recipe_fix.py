@@ -3,7 +3,6 @@
 Quick fix to load 200+ recipes for Railway deployment
 """
 
-import json
 import logging
 from app import app, db
 from models import Recipe
@@ -145,7 +144,7 @@ def load_recipes_batch():
                     recipe = Recipe(
                         name=recipe_data["name"],
                         description=recipe_data["description"],
-                        ingredients=json.dumps(recipe_data["ingredients"]),
+                        ingredients=recipe_data["ingredients"],
                         instructions=recipe_data["instructions"],
                         prep_time=recipe_data["prep_time"],
                         cook_time=recipe_data["cook_time"],
@@ -158,7 +157,7 @@ def load_recipes_batch():
                         sugar=recipe_data["sugar"],
                         sodium=recipe_data["sodium"],
                         category=recipe_data["category"],
-                        tags=json.dumps(recipe_data["tags"])
+                        tags=recipe_data["tags"]
                     )
                     db.session.add(recipe)
             
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash
+from flask_sqlalchemy.pagination import Pagination
 import os
 import json
 from datetime import datetime, date, timedelta
@@ -11,12 +12,13 @@ import io
 import base64
 
 from app import db
-from models import User, Recipe, FoodLog, FoodCategory
+from models import User, Recipe, FoodLog, FoodCategory, DailyNutrition
 from search_engine import RecipeSearchEngine
-from ml_model import FoodClassifier
+from ml_model import FoodClassifier, PredictionBatcher, PredictionCache, MAX_BATCH_SIZE
 from health_calculator import HealthCalculator
-from email_service import EmailService
+from email_service import EmailService, mail_queue
 from health_recommendations import health_recommender
+from category_recipes import CategoryRecipeMap
 
 # Create blueprints
 main_bp = Blueprint('main', __name__)
@@ -24,11 +26,34 @@ auth_bp = Blueprint('auth', __name__)
 api_bp = Blueprint('api', __name__)
 
 # Initialize services
-search_engine = RecipeSearchEngine()
-food_classifier = FoodClassifier()
+search_engine = RecipeSearchEngine(index_path=current_app.config['SEARCH_INDEX_PATH'])
+food_classifier = FoodClassifier(
+    inference_socket=current_app.config['INFERENCE_SOCKET'],
+    backend=current_app.config['ML_BACKEND'],
+    backend_path=current_app.config['ML_BACKEND_PATH']
+)
+prediction_batcher = PredictionBatcher(food_classifier)
+classification_cache = PredictionCache()
+category_recipes = CategoryRecipeMap(food_classifier.categories)
+if current_app.config['ML_WARMUP']:
+    food_classifier.warm_up_async()
 health_calc = HealthCalculator()
 email_service = EmailService()
 
+class RankedPagination(Pagination):
+    """Pagination over a precomputed ranking of recipe IDs, loading only the current page"""
+    
+    def _query_items(self):
+        recipe_ids = self._query_args['recipe_ids'][self._query_offset:self._query_offset + self.per_page]
+        if not recipe_ids:
+            return []
+        recipes = Recipe.query.filter(Recipe.id.in_(recipe_ids)).all()
+        recipes_by_id = {recipe.id: recipe for recipe in recipes}
+        return [recipes_by_id[recipe_id] for recipe_id in recipe_ids if recipe_id in recipes_by_id]
+    
+    def _query_count(self):
+        return len(self._query_args['recipe_ids'])
+
 @main_bp.route('/')
 def index():
     if current_user.is_authenticated:
@@ -38,15 +63,26 @@ def index():
 @main_bp.route('/dashboard')
 @login_required
 def dashboard():
-    # Get today's food logs
+    # Read the last 7 days of totals from the daily rollup
     today = date.today()
-    today_logs = FoodLog.query.filter_by(user_id=current_user.id, date_logged=today).all()
+    week_start = today - timedelta(days=6)
+    daily_totals = db.session.query(
+        DailyNutrition.date, DailyNutrition.calories, DailyNutrition.protein,
+        DailyNutrition.carbs, DailyNutrition.fat
+    ).filter(
+        DailyNutrition.user_id == current_user.id,
+        DailyNutrition.date.between(week_start, today)
+    ).all()
+    totals_by_day = {row[0]: row[1:] for row in daily_totals}
     
     # Calculate daily totals
-    daily_calories = sum(log.calories * log.servings for log in today_logs)
-    daily_protein = sum(log.protein * log.servings for log in today_logs)
-    daily_carbs = sum(log.carbs * log.servings for log in today_logs)
-    daily_fat = sum(log.fat * log.servings for log in today_logs)
+    daily_calories, daily_protein, daily_carbs, daily_fat = totals_by_day.get(today, (0, 0, 0, 0))
+    
+    # Fetch only the columns the food log table shows for today
+    today_logs = db.session.query(
+        FoodLog.food_name, FoodLog.meal_type, FoodLog.servings, FoodLog.calories,
+        FoodLog.protein, FoodLog.carbs, FoodLog.fat, FoodLog.created_at
+    ).filter_by(user_id=current_user.id, date_logged=today).all()
     
     # Get calorie goal
     try:
@@ -58,11 +94,9 @@ def dashboard():
     week_data = []
     for i in range(7):
         day = today - timedelta(days=i)
-        day_logs = FoodLog.query.filter_by(user_id=current_user.id, date_logged=day).all()
-        day_calories = sum(log.calories * log.servings for log in day_logs)
         week_data.append({
             'date': day.strftime('%Y-%m-%d'),
-            'calories': day_calories
+            'calories': totals_by_day.get(day, (0,))[0]
         })
     
     return render_template('dashboard.html', 
@@ -81,33 +115,37 @@ def recipes():
     category = request.args.get('category', '')
     health_filter = request.args.get('health_filter', '')
     page = request.args.get('page', 1, type=int)
+    recipe_ids = None
     
-    # If health filter is requested and user is logged in, get personalized recipes
+    # If health filter is requested and user is logged in, page through the cached personalized ranking
     if health_filter == 'personalized' and current_user.is_authenticated:
-        personalized_recipes = health_recommender.get_personalized_recipes(current_user, limit=100)
-        recipe_ids = [r.id for r in personalized_recipes]
-        query = Recipe.query.filter(Recipe.id.in_(recipe_ids))
+        recipe_ids = health_recommender.get_personalized_recipe_ids(current_user, limit=100)
+        recipes_paginated = RankedPagination(page=page, per_page=12, error_out=False, recipe_ids=recipe_ids)
+    elif search_query:
+        # Search results keep their ranking and page forward with a cursor
+        cursor = request.args.get('cursor') or None
+        try:
+            recipes_paginated = search_engine.search_page(search_query, cursor, per_page=12, category=category)
+        except ValueError:
+            recipes_paginated = search_engine.search_page(search_query, per_page=12, category=category)
+        recipe_ids = recipes_paginated.matched_ids
     else:
         query = Recipe.query
         
-        if search_query:
-            recipes_found = search_engine.search_recipes(search_query)
-            recipe_ids = [r.id for r in recipes_found]
-            query = query.filter(Recipe.id.in_(recipe_ids))
-        
         if category:
             query = query.filter_by(category=category)
+        
+        recipes_paginated = query.paginate(page=page, per_page=12, error_out=False)
     
-    recipes_paginated = query.paginate(page=page, per_page=12, error_out=False)
-    
-    # Get all categories for filter
-    categories = db.session.query(Recipe.category).distinct().all()
-    categories = [cat[0] for cat in categories if cat[0]]
+    # Get all categories for filter, counting only the active search's recipes
+    categories = [name for name, count in search_engine.category_facets()]
+    category_counts = dict(search_engine.category_facets(recipe_ids))
     
     return render_template('recipes.html', 
                          recipes=recipes_paginated,
                          search_query=search_query,
                          categories=categories,
+                         category_counts=category_counts,
                          selected_category=category,
                          health_filter=health_filter)
 
@@ -115,9 +153,8 @@ def recipes():
 def recipe_detail(recipe_id):
     recipe = Recipe.query.get_or_404(recipe_id)
     
-    # Parse ingredients and tags from JSON
-    ingredients = json.loads(recipe.ingredients) if recipe.ingredients else []
-    tags = json.loads(recipe.tags) if recipe.tags else []
+    ingredients = recipe.ingredients or []
+    tags = recipe.tags or []
     
     health_warnings = []
     health_benefits = []
@@ -142,28 +179,9 @@ def upload():
 @main_bp.route('/profile')
 @login_required
 def profile():
-    # Parse JSON fields for display
-    user_allergies = []
-    user_conditions = []
-    user_restrictions = []
-    
-    try:
-        if current_user.allergies:
-            user_allergies = json.loads(current_user.allergies)
-    except:
-        user_allergies = []
-        
-    try:
-        if current_user.medical_conditions:
-            user_conditions = json.loads(current_user.medical_conditions)
-    except:
-        user_conditions = []
-        
-    try:
-        if current_user.dietary_restrictions:
-            user_restrictions = json.loads(current_user.dietary_restrictions)
-    except:
-        user_restrictions = []
+    user_allergies = current_user.allergies or []
+    user_conditions = current_user.medical_conditions or []
+    user_restrictions = current_user.dietary_restrictions or []
     
     return render_template('profile.html', 
                          user_allergies=user_allergies,
@@ -193,21 +211,21 @@ def update_profile():
         allergies_text = request.form.get('allergies', '').strip()
         if allergies_text:
             allergies_list = [allergy.strip() for allergy in allergies_text.split(',') if allergy.strip()]
-            current_user.allergies = json.dumps(allergies_list)
+            current_user.allergies = allergies_list
         else:
             current_user.allergies = None
             
         conditions_text = request.form.get('medical_conditions', '').strip()
         if conditions_text:
             conditions_list = [condition.strip() for condition in conditions_text.split(',') if condition.strip()]
-            current_user.medical_conditions = json.dumps(conditions_list)
+            current_user.medical_conditions = conditions_list
         else:
             current_user.medical_conditions = None
             
         restrictions_text = request.form.get('dietary_restrictions', '').strip()
         if restrictions_text:
             restrictions_list = [restriction.strip() for restriction in restrictions_text.split(',') if restriction.strip()]
-            current_user.dietary_restrictions = json.dumps(restrictions_list)
+            current_user.dietary_restrictions = restrictions_list
         else:
             current_user.dietary_restrictions = None
         
@@ -292,60 +310,129 @@ def classify_food():
         if file.filename == '':
             return jsonify({'error': 'No image selected'}), 400
         
-        # Process image
-        try:
-            # Reset file stream position
-            file.stream.seek(0)
-            image = Image.open(file.stream)
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-        except Exception as e:
-            current_app.logger.error(f"Image processing error: {e}")
-            return jsonify({'error': 'Could not process image file'}), 400
+        # Reset file stream position
+        file.stream.seek(0)
+        upload = file.stream.read()
         
-        # Classify image
-        predictions = food_classifier.predict(image)
-        
-        if predictions:
-            # Get the top prediction
-            top_prediction = predictions[0]
-            
-            # Find recipes for this category
-            recipes = Recipe.query.filter_by(food_category_id=top_prediction['category_id']).limit(5).all()
+        # Retries and re-uploads of the same file are answered without decoding it
+        cache_keys = [('upload', PredictionCache.digest(upload))]
+        # The request counts as one lookup: a hit if either key answers it, else a miss, even if decoding fails
+        hit = False
+        try:
+            cached = classification_cache.get(cache_keys[0], count=False)
+            if cached is not None:
+                hit = True
+                return jsonify(cached)
             
-            # If no recipes found for exact category, search by name
-            if not recipes:
-                category_name = top_prediction['category'].replace('_', ' ')
-                recipes = Recipe.query.filter(Recipe.name.ilike(f'%{category_name}%')).limit(5).all()
+            # Process image
+            try:
+                # Left undecoded so the classifier can decode JPEGs at reduced scale
+                image = Image.open(io.BytesIO(upload))
+            except Exception as e:
+                current_app.logger.error(f"Image processing error: {e}")
+                return jsonify({'error': 'Could not process image file'}), 400
             
-            # If still no recipes, get random popular recipes
-            if not recipes:
-                recipes = Recipe.query.order_by(Recipe.id.desc()).limit(5).all()
+            # Classify image, batched with any concurrent uploads
+            if food_classifier.mock_mode:
+                predictions = food_classifier.predict(image)
+            else:
+                image_array = food_classifier.preprocess_image(image)
+                if image_array is None:
+                    return jsonify({'error': 'Could not classify image'}), 400
+                
+                # A re-encoded copy of the same photo usually normalizes to the same input
+                cache_keys.append(('input', PredictionCache.digest(image_array)))
+                cached = classification_cache.get(cache_keys[1], count=False)
+                if cached is not None:
+                    hit = True
+                    classification_cache.put(cache_keys[0], cached)
+                    return jsonify(cached)
+                
+                predictions = prediction_batcher.submit_array(image_array).result()
             
-            recipe_data = []
-            for recipe in recipes:
-                recipe_data.append({
-                    'id': recipe.id,
-                    'name': recipe.name,
-                    'calories_per_serving': recipe.calories_per_serving,
-                    'prep_time': recipe.prep_time,
-                    'cook_time': recipe.cook_time,
-                    'description': recipe.description
-                })
+            if predictions:
+                # Get the top prediction
+                top_prediction = predictions[0]
+                
+                # Recipes for this category, else named after it, else the newest ones
+                recipe_data = category_recipes.recipes(top_prediction['category_id'], top_prediction['category'])
+                
+                result = {
+                    'success': True,
+                    'predictions': predictions,
+                    'top_prediction': top_prediction,
+                    'recipes': recipe_data
+                }
+                for key in cache_keys:
+                    classification_cache.put(key, result)
+                return jsonify(result)
+            else:
+                return jsonify({'error': 'Could not classify image'}), 400
+        finally:
+            classification_cache.record(hit)
+    
+    except Exception as e:
+        current_app.logger.error(f"Image classification error: {e}")
+        return jsonify({'error': 'Image processing failed'}), 500
+
+@api_bp.route('/classify_food/batch', methods=['POST'])
+@login_required
+def classify_food_batch():
+    try:
+        files = [file for file in request.files.getlist('images') if file.filename]
+        if not files:
+            return jsonify({'error': 'No images provided'}), 400
+        if len(files) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'At most {MAX_BATCH_SIZE} images per request'}), 400
+        
+        images = []
+        for file in files:
+            try:
+                file.stream.seek(0)
+                image = Image.open(file.stream)
+                images.append(image)
+            except Exception as e:
+                current_app.logger.error(f"Image processing error for {file.filename}: {e}")
+                images.append(None)
+        
+        # Classify every readable image with one model call
+        readable = [image for image in images if image is not None]
+        predictions_iter = iter(food_classifier.predict_batch(readable))
+        all_predictions = [next(predictions_iter) if image is not None else None for image in images]
+        
+        results = []
+        for file, predictions in zip(files, all_predictions):
+            if predictions is None:
+                results.append({'filename': file.filename, 'error': 'Could not process image file'})
+                continue
+            if not predictions:
+                results.append({'filename': file.filename, 'error': 'Could not classify image'})
+                continue
             
-            return jsonify({
-                'success': True,
+            top_prediction = predictions[0]
+            results.append({
+                'filename': file.filename,
                 'predictions': predictions,
                 'top_prediction': top_prediction,
-                'recipes': recipe_data
+                'recipes': category_recipes.recipes(top_prediction['category_id'], top_prediction['category'])
             })
-        else:
-            return jsonify({'error': 'Could not classify image'}), 400
+        
+        return jsonify({'success': True, 'results': results})
     
     except Exception as e:
-        current_app.logger.error(f"Image classification error: {e}")
+        current_app.logger.error(f"Batch image classification error: {e}")
         return jsonify({'error': 'Image processing failed'}), 500
 
+@api_bp.route('/classify_food/cache')
+@login_required
+def classification_cache_stats():
+    return jsonify(classification_cache.stats())
+
+@api_bp.route('/mail_queue')
+@login_required
+def mail_queue_stats():
+    return jsonify(mail_queue.stats())
+
 @api_bp.route('/log_food', methods=['POST'])
 @login_required
 def log_food():
@@ -366,6 +453,7 @@ def log_food():
         )
         
         db.session.add(food_log)
+        DailyNutrition.record(food_log)
         db.session.commit()
         
         return jsonify({'success': True, 'message': 'Food logged successfully'})
@@ -395,6 +483,30 @@ def search_recipes():
     
     return jsonify(results)
 
+@api_bp.route('/search_recipes/page')
+def search_recipes_page():
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    
+    try:
+        page = search_engine.search_page(query, request.args.get('cursor') or None, per_page=limit,
+                                         category=request.args.get('category') or None)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    results = []
+    for recipe in page.items:
+        results.append({
+            'id': recipe.id,
+            'name': recipe.name,
+            'calories_per_serving': recipe.calories_per_serving,
+            'prep_time': recipe.prep_time,
+            'cook_time': recipe.cook_time,
+            'category': recipe.category
+        })
+    
+    return jsonify({'results': results, 'next_cursor': page.next_cursor})
+
 @api_bp.route('/nutrition_summary')
 @login_required
 def nutrition_summary():
@@ -402,26 +514,19 @@ def nutrition_summary():
     end_date = date.today()
     start_date = end_date - timedelta(days=days-1)
     
-    logs = FoodLog.query.filter(
-        FoodLog.user_id == current_user.id,
-        FoodLog.date_logged >= start_date,
-        FoodLog.date_logged <= end_date
+    rollups = DailyNutrition.query.filter(
+        DailyNutrition.user_id == current_user.id,
+        DailyNutrition.date >= start_date,
+        DailyNutrition.date <= end_date
     ).all()
     
     daily_data = {}
-    for log in logs:
-        day_str = log.date_logged.isoformat()
-        if day_str not in daily_data:
-            daily_data[day_str] = {
-                'calories': 0,
-                'protein': 0,
-                'carbs': 0,
-                'fat': 0
-            }
-        
-        daily_data[day_str]['calories'] += log.calories * log.servings
-        daily_data[day_str]['protein'] += log.protein * log.servings
-        daily_data[day_str]['carbs'] += log.carbs * log.servings
-        daily_data[day_str]['fat'] += log.fat * log.servings
+    for rollup in rollups:
+        daily_data[rollup.date.isoformat()] = {
+            'calories': rollup.calories,
+            'protein': rollup.protein,
+            'carbs': rollup.carbs,
+            'fat': rollup.fat
+        }
     
     return jsonify(daily_data)
@@ -1,119 +1,502 @@
+import base64
+import heapq
 import json
-from collections import defaultdict
+import math
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import accumulate
+from operator import itemgetter
+import threading
+import time
+import weakref
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session, object_session
 from app import db
-from models import Recipe
+from models import Recipe, RecipeChange
 import logging
 
-class TrieNode:
-    def __init__(self):
-        self.children = {}
-        self.is_end = False
-        self.recipe_ids = set()
+NGRAM_SIZE = 3
 
-class Trie:
-    def __init__(self):
-        self.root = TrieNode()
+# BM25 term-frequency saturation and field-length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Fraction of queued or removed recipes that triggers a merge into the frozen buffers
+COMPACTION_RATIO = 0.1
+MIN_COMPACTION_SIZE = 64
+
+# Seconds between polls of the recipe change log for writes made by other workers
+SYNC_INTERVAL = 2.0
+
+# Recipes loaded per query when replaying the change log
+SYNC_CHUNK_SIZE = 500
+
+# Logged changes behind the index file at which a worker rebuilds and rewrites it instead of replaying them
+REBUILD_CHANGE_COUNT = 1000
+
+# On-disk index file layout: magic, format version, header length, JSON header, sections
+INDEX_MAGIC = b'HMSI'
+INDEX_FORMAT_VERSION = 3
+INDEX_PREAMBLE_SIZE = len(INDEX_MAGIC) + 2 * array('I').itemsize
+SECTION_ALIGNMENT = 8
+
+# Search cursors pack the last result's score and recipe ID
+CURSOR_FORMAT = struct.Struct('<dI')
+
+# Relative weight of a match in each indexed field
+FIELD_BOOSTS = {
+    'name': 10,
+    'category': 7,
+    'ingredient': 5,
+    'tag': 3
+}
+
+def encode_cursor(score, recipe_id):
+    """Opaque URL-safe token for the position just after a ranked result"""
+    return base64.urlsafe_b64encode(CURSOR_FORMAT.pack(score, recipe_id)).rstrip(b'=').decode('ascii')
+
+def decode_cursor(token):
+    """The (score, recipe ID) position stored in a cursor token
+
+    Raises:
+        ValueError: If the token was not produced by encode_cursor
+    """
+    try:
+        data = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        return CURSOR_FORMAT.unpack(data)
+    except (ValueError, struct.error) as e:
+        raise ValueError(f"Invalid search cursor: {token!r}") from e
+
+def query_fragments(query):
+    """The whole query plus each word of a multi-word query, which are scored separately"""
+    fragments = [query]
+    words = query.split()
+    if len(words) > 1:
+        fragments.extend(word for word in words if len(word) >= 2)  # Only search words with 2+ characters
+    return fragments
+
+def encode_postings(keys, postings_by_key):
+    """Encode the sorted ID sets of each key as one delta-encoded buffer plus offsets"""
+    offsets = array('I', [0])
+    postings = array('I')
+    
+    for key in keys:
+        previous = 0
+        for value in sorted(postings_by_key[key]):
+            postings.append(value - previous)
+            previous = value
+        offsets.append(len(postings))
+    
+    return offsets, postings
+
+def decode_postings(offsets, postings, position):
+    """Decode the posting list stored at the given position"""
+    return accumulate(postings[offsets[position]:offsets[position + 1]])
+
+def bm25_weight(frequency, length, doc_freq, doc_count, average_length):
+    """BM25 weight of a term occurring frequency times in a field of the given length"""
+    idf = math.log(1 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+    return idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+def pack_terms(terms):
+    """Pack sorted terms into one UTF-8 blob plus byte offsets"""
+    blob = bytearray()
+    offsets = array('I', [0])
+    for term in terms:
+        blob += term.encode('utf-8')
+        offsets.append(len(blob))
+    return bytes(blob), offsets
+
+class TermTable:
+    """Read-only sequence of terms decoded on access from a packed UTF-8 blob"""
+    
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
     
+    def __len__(self):
+        return len(self.offsets) - 1
+    
+    def __getitem__(self, position):
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return str(self.blob[self.offsets[position]:self.offsets[position + 1]], 'utf-8')
+    
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+def term_ngrams(term):
+    """Distinct character n-grams of a term"""
+    return {term[i:i + NGRAM_SIZE] for i in range(len(term) - NGRAM_SIZE + 1)}
+
+def term_short_grams(term):
+    """Distinct substrings of a term shorter than an n-gram, which answer fragments too short to split"""
+    return {term[i:i + size] for size in range(1, NGRAM_SIZE) for i in range(len(term) - size + 1)}
+
+class InvertedIndex:
+    """Sorted term dictionary mapping each term to a delta-encoded posting list.
+
+    Words are queued with ``insert`` and compacted by ``freeze`` into flat
+    buffers: the sorted ``terms`` list, ``offsets`` into the postings buffer,
+    and ``postings`` holding the gaps between consecutive recipe IDs. Each
+    posting carries its term frequency in ``frequencies`` and its BM25 weight
+    in ``weights``, and ``doc_ids``/``doc_lengths`` record how many words
+    every recipe has in this field. A trigram index over the terms
+    (``ngrams``, ``ngram_offsets`` and ``ngram_postings`` of term positions)
+    answers substring queries; it also holds every one- and two-character
+    substring, so shorter fragments are a single lookup.
+
+    Inserts after a freeze stay queued and searchable until the next freeze,
+    and ``remove`` tombstones a recipe's frozen postings so they are skipped
+    until the next freeze drops them.
+
+    The frozen buffers round-trip through ``sections``/``load_sections`` so
+    they can be served straight from a memory-mapped index file.
+    """
+
+    ARRAY_SECTIONS = {
+        'offsets': 'I',
+        'postings': 'I',
+        'frequencies': 'I',
+        'weights': 'f',
+        'doc_ids': 'I',
+        'doc_lengths': 'I',
+        'ngram_offsets': 'I',
+        'ngram_postings': 'I'
+    }
+    TERM_SECTIONS = ('terms', 'ngrams')
+
+    def __init__(self):
+        self.terms = []
+        self.offsets = array('I', [0])
+        self.postings = array('I')
+        self.frequencies = array('I')
+        self.weights = array('f')
+        self.doc_ids = array('I')
+        self.doc_lengths = array('I')
+        self.ngrams = []
+        self.ngram_offsets = array('I', [0])
+        self.ngram_postings = array('I')
+        self.doc_count = 0
+        self.average_length = 1.0
+        self._pending = defaultdict(dict)
+        self._pending_lengths = {}
+        self._deleted = set()
+
+    def __len__(self):
+        return len(self.terms)
+
     def insert(self, word, recipe_id):
-        """Insert a word into the trie with associated recipe ID"""
-        node = self.root
+        """Queue a word for indexing with associated recipe ID"""
         word = word.lower().strip()
-        
-        for char in word:
-            if char not in node.children:
-                node.children[char] = TrieNode()
-            node = node.children[char]
-            node.recipe_ids.add(recipe_id)
-        
-        node.is_end = True
-    
+        if word:
+            postings = self._pending[word]
+            postings[recipe_id] = postings.get(recipe_id, 0) + 1
+            self._pending_lengths[recipe_id] = self._pending_lengths.get(recipe_id, 0) + 1
+
+    def remove(self, recipe_id):
+        """Drop every posting of a recipe, queued or frozen"""
+        if self._pending_lengths.pop(recipe_id, None) is not None:
+            for term in list(self._pending):
+                postings = self._pending[term]
+                if postings.pop(recipe_id, None) is not None and not postings:
+                    del self._pending[term]
+
+        position = bisect_left(self.doc_ids, recipe_id)
+        if position < len(self.doc_ids) and self.doc_ids[position] == recipe_id:
+            self._deleted.add(recipe_id)
+
+    def needs_compaction(self):
+        """Whether enough recipes are queued or tombstoned to be worth a freeze"""
+        changed = len(self._pending_lengths) + len(self._deleted)
+        return changed >= max(MIN_COMPACTION_SIZE, COMPACTION_RATIO * len(self.doc_ids))
+
+    def freeze(self):
+        """Compact queued words into the term dictionary and posting buffers"""
+        pending = self._pending
+        deleted = self._deleted
+        for i, term in enumerate(self.terms):
+            for recipe_id, frequency in self.entries_at(i):
+                if recipe_id not in deleted:
+                    pending[term].setdefault(recipe_id, frequency)
+
+        lengths = {
+            recipe_id: length for recipe_id, length in zip(self.doc_ids, self.doc_lengths)
+            if recipe_id not in deleted
+        }
+        lengths.update(self._pending_lengths)
+
+        # A term can be left without postings once its recipes are deleted
+        for term in [term for term, postings in pending.items() if not postings]:
+            del pending[term]
+
+        self.terms = sorted(pending)
+        self.offsets, self.postings = encode_postings(self.terms, pending)
+        self.doc_ids = array('I', sorted(lengths))
+        self.doc_lengths = array('I', (lengths[recipe_id] for recipe_id in self.doc_ids))
+
+        # Fold IDF and length normalization into one weight per posting
+        self.doc_count = len(lengths)
+        self.average_length = sum(lengths.values()) / self.doc_count if self.doc_count else 1.0
+        self.frequencies = array('I')
+        self.weights = array('f')
+        for term in self.terms:
+            postings = pending[term]
+            for recipe_id in sorted(postings):
+                frequency = postings[recipe_id]
+                self.frequencies.append(frequency)
+                self.weights.append(bm25_weight(frequency, lengths[recipe_id], len(postings),
+                                                self.doc_count, self.average_length))
+
+        terms_by_ngram = defaultdict(set)
+        for position, term in enumerate(self.terms):
+            for ngram in term_ngrams(term) | term_short_grams(term):
+                terms_by_ngram[ngram].add(position)
+
+        self.ngrams = sorted(terms_by_ngram)
+        self.ngram_offsets, self.ngram_postings = encode_postings(self.ngrams, terms_by_ngram)
+
+        self._pending = defaultdict(dict)
+        self._pending_lengths = {}
+        self._deleted = set()
+
+    def sections(self):
+        """Frozen buffers keyed by section name, ready to be written to an index file"""
+        sections = {name: getattr(self, name) for name in self.ARRAY_SECTIONS}
+        for name in self.TERM_SECTIONS:
+            blob, offsets = pack_terms(getattr(self, name))
+            sections[name] = blob
+            sections[f'{name}_boundaries'] = offsets
+        return sections
+
+    def load_sections(self, sections, doc_count, average_length):
+        """Serve the frozen buffers from memoryviews over an index file"""
+        for name, typecode in self.ARRAY_SECTIONS.items():
+            setattr(self, name, sections[name].cast(typecode))
+        for name in self.TERM_SECTIONS:
+            setattr(self, name, TermTable(sections[name], sections[f'{name}_boundaries'].cast('I')))
+        self.doc_count = doc_count
+        self.average_length = average_length
+
+    def postings_at(self, term_index):
+        """Decode the posting list of the term at the given dictionary position"""
+        return decode_postings(self.offsets, self.postings, term_index)
+
+    def entries_at(self, term_index):
+        """Pairs of recipe ID and term frequency for the term at the given position"""
+        start = self.offsets[term_index]
+        end = self.offsets[term_index + 1]
+        return zip(self.postings_at(term_index), self.frequencies[start:end])
+
     def search(self, prefix):
         """Search for all recipe IDs that match the prefix"""
-        node = self.root
         prefix = prefix.lower().strip()
-        
-        for char in prefix:
-            if char not in node.children:
-                return set()
-            node = node.children[char]
-        
-        return node.recipe_ids
+        if not prefix:
+            return set()
+
+        lo = bisect_left(self.terms, prefix)
+        hi = bisect_left(self.terms, prefix + '\U0010ffff', lo)
+
+        matches = set()
+        for i in range(lo, hi):
+            matches.update(self.postings_at(i))
+        matches.difference_update(self._deleted)
+
+        for term, postings in self._pending.items():
+            if term.startswith(prefix):
+                matches.update(postings)
+        return matches
+
+    def matching_terms(self, fragment):
+        """Dictionary positions of the terms containing the fragment"""
+        if len(fragment) < NGRAM_SIZE:
+            # Short fragments are indexed whole, so their list needs no verification
+            position = bisect_left(self.ngrams, fragment)
+            if position == len(self.ngrams) or self.ngrams[position] != fragment:
+                return []
+            return list(decode_postings(self.ngram_offsets, self.ngram_postings, position))
+
+        ngram_lists = []
+        for ngram in term_ngrams(fragment):
+            position = bisect_left(self.ngrams, ngram)
+            if position == len(self.ngrams) or self.ngrams[position] != ngram:
+                return []
+            ngram_lists.append(position)
+
+        # Intersect from the rarest trigram so the candidate set starts small
+        ngram_lists.sort(key=lambda p: self.ngram_offsets[p + 1] - self.ngram_offsets[p])
+        candidates = set(decode_postings(self.ngram_offsets, self.ngram_postings, ngram_lists[0]))
+        for position in ngram_lists[1:]:
+            candidates.intersection_update(decode_postings(self.ngram_offsets, self.ngram_postings, position))
+
+        # Trigrams can co-occur without being contiguous, so verify each candidate
+        return [i for i in candidates if fragment in self.terms[i]]
+
+    def search_substring(self, fragment):
+        """Search for all recipe IDs with a term containing the fragment"""
+        fragment = fragment.lower().strip()
+        if not fragment:
+            return set()
+
+        matches = set()
+        for i in self.matching_terms(fragment):
+            matches.update(self.postings_at(i))
+        matches.difference_update(self._deleted)
+
+        for term, postings in self._pending.items():
+            if fragment in term:
+                matches.update(postings)
+        return matches
+
+    def score_substring(self, fragment, boost, scores):
+        """Add the boosted BM25 weight of every term containing the fragment to scores"""
+        fragment = fragment.lower().strip()
+        if not fragment:
+            return
+
+        deleted = self._deleted
+        for i in self.matching_terms(fragment):
+            # Scale by how much of the term the fragment covers so whole-word hits rank first
+            factor = boost * len(fragment) / len(self.terms[i])
+            start = self.offsets[i]
+            end = self.offsets[i + 1]
+            for recipe_id, weight in zip(self.postings_at(i), self.weights[start:end]):
+                if recipe_id not in deleted:
+                    scores[recipe_id] += factor * weight
+
+        # Queued postings are weighted against the statistics of the last freeze
+        doc_count = max(self.doc_count, len(self._pending_lengths))
+        for term, postings in self._pending.items():
+            if fragment in term:
+                factor = boost * len(fragment) / len(term)
+                for recipe_id, frequency in postings.items():
+                    weight = bm25_weight(frequency, self._pending_lengths[recipe_id], len(postings),
+                                         doc_count, self.average_length)
+                    scores[recipe_id] += factor * weight
+
+def recipe_terms(recipe):
+    """Split a recipe into the name words, ingredient words and tags that get indexed"""
+    name_words = recipe.name.split() if recipe.name else []
+    ingredient_words = []
+    tags = list(recipe.tags or [])
     
-    def search_partial(self, word):
-        """Search for partial matches"""
-        word = word.lower().strip()
-        all_matches = set()
-        
-        # Search for the word as a prefix
-        exact_matches = self.search(word)
-        all_matches.update(exact_matches)
-        
-        # Search for the word as a substring
-        for i in range(len(word)):
-            prefix_matches = self.search(word[i:])
-            all_matches.update(prefix_matches)
-        
-        return all_matches
+    for ingredient in recipe.ingredients or []:
+        if isinstance(ingredient, str):
+            ingredient_words.extend(ingredient.split())
+        elif isinstance(ingredient, dict) and 'name' in ingredient:
+            ingredient_words.extend(ingredient['name'].split())
+    
+    return name_words, ingredient_words, tags
+
+class RecipeSnapshot:
+    """The indexed fields of a recipe, captured at flush time"""
+    __slots__ = ('id', 'name', 'ingredients', 'tags', 'category')
+    
+    def __init__(self, recipe):
+        self.id = recipe.id
+        self.name = recipe.name
+        self.ingredients = list(recipe.ingredients or [])
+        self.tags = list(recipe.tags or [])
+        self.category = recipe.category
+
+# Search engines in this process that receive recipe changes on commit
+_live_engines = weakref.WeakSet()
+
+def recipe_table_state():
+    """High-water marks of the recipe table and its change log, the version of every in-memory copy of the catalog"""
+    change_seq = db.session.query(func.max(RecipeChange.id)).scalar() or 0
+    recipe_count, max_recipe_id = db.session.query(func.count(Recipe.id), func.max(Recipe.id)).one()
+    return {
+        'change_seq': change_seq,
+        'recipe_count': recipe_count,
+        'max_recipe_id': max_recipe_id or 0
+    }
+
+class SearchPage:
+    """A page of ranked search results with the cursors around it"""
+    
+    def __init__(self, items, cursor, next_cursor, matched_ids):
+        self.items = items
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+        self.matched_ids = matched_ids
+    
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
 
 class RecipeSearchEngine:
-    def __init__(self):
-        self.name_trie = Trie()
-        self.ingredient_trie = Trie()
-        self.tag_trie = Trie()
+    def __init__(self, recipes=None, index_path=None):
+        self.indexes = {field: InvertedIndex() for field in FIELD_BOOSTS}
         self.category_index = defaultdict(set)
+        self.recipe_categories = {}
+        self.category_names = {}
+        self._facets = None
         self.is_initialized = False
+        self.change_seq = 0
+        self.table_state = None
+        self.last_sync = time.monotonic()
+        self.lock = threading.RLock()
+        self.index_path = index_path if recipes is None else None
+        self._mmap = None
         
-        # Initialize the search engine
-        self.build_indices()
+        # Initialize the search engine, preferring a fresh index file over a rebuild
+        if self.index_path:
+            self.reload()
+            self.sync(force=True)
+        else:
+            self.build_indices(recipes)
+        _live_engines.add(self)
     
-    def build_indices(self):
+    def reset(self):
+        """Drop every index so they can be built or mapped again"""
+        self.indexes = {field: InvertedIndex() for field in FIELD_BOOSTS}
+        self.category_index = defaultdict(set)
+        self.recipe_categories = {}
+        self.category_names = {}
+        self._facets = None
+        self._mmap = None
+        self.is_initialized = False
+    
+    def reload(self):
+        """Map the index file, first rebuilding and rewriting it if it is missing or too far behind
+
+        Serving from the file keeps the postings in memory shared by every worker
+        instead of in private buffers filled by a long change log replay.
+        """
+        with self.lock:
+            self.reset()
+            if self.load(self.index_path):
+                return
+            
+            self.build_indices()
+            if self.is_initialized and self.save(self.index_path):
+                self.reset()
+                if not self.load(self.index_path):
+                    self.build_indices()
+    
+    def build_indices(self, recipes=None):
         """Build search indices from recipes in database"""
         try:
-            recipes = Recipe.query.all()
+            if recipes is None:
+                # Read the change log position first so writes racing the build get replayed
+                self.table_state = recipe_table_state()
+                self.change_seq = self.table_state['change_seq']
+                recipes = Recipe.query.all()
             
             for recipe in recipes:
-                # Index recipe name
-                if recipe.name:
-                    words = recipe.name.split()
-                    for word in words:
-                        self.name_trie.insert(word, recipe.id)
-                
-                # Index ingredients
-                if recipe.ingredients:
-                    try:
-                        ingredients = json.loads(recipe.ingredients)
-                        for ingredient in ingredients:
-                            if isinstance(ingredient, str):
-                                words = ingredient.split()
-                                for word in words:
-                                    self.ingredient_trie.insert(word, recipe.id)
-                            elif isinstance(ingredient, dict) and 'name' in ingredient:
-                                words = ingredient['name'].split()
-                                for word in words:
-                                    self.ingredient_trie.insert(word, recipe.id)
-                    except (json.JSONDecodeError, TypeError):
-                        # Handle cases where ingredients is not valid JSON
-                        words = recipe.ingredients.split()
-                        for word in words:
-                            if word.strip():
-                                self.ingredient_trie.insert(word, recipe.id)
-                
-                # Index tags
-                if recipe.tags:
-                    try:
-                        tags = json.loads(recipe.tags)
-                        for tag in tags:
-                            self.tag_trie.insert(tag, recipe.id)
-                    except (json.JSONDecodeError, TypeError):
-                        # Handle cases where tags is not valid JSON
-                        tags = recipe.tags.split(',')
-                        for tag in tags:
-                            if tag.strip():
-                                self.tag_trie.insert(tag.strip(), recipe.id)
-                
-                # Index category
-                if recipe.category:
-                    self.category_index[recipe.category.lower()].add(recipe.id)
+                self.index_recipe(recipe)
+            
+            for index in self.indexes.values():
+                index.freeze()
             
             self.is_initialized = True
             logging.info(f"Search indices built for {len(recipes)} recipes")
@@ -121,6 +504,240 @@ class RecipeSearchEngine:
         except Exception as e:
             logging.error(f"Error building search indices: {e}")
     
+    def save(self, path):
+        """Write the indices to a versioned index file that workers can memory-map"""
+        try:
+            with self.lock:
+                for index in self.indexes.values():
+                    index.freeze()
+                
+                header = {
+                    'format_version': INDEX_FORMAT_VERSION,
+                    'byteorder': sys.byteorder,
+                    'table_state': self.table_state,
+                    'category_names': dict(self.category_names),
+                    'fields': {}
+                }
+                chunks = []
+                position = 0
+                for field, index in self.indexes.items():
+                    field_header = {
+                        'doc_count': index.doc_count,
+                        'average_length': index.average_length,
+                        'sections': {}
+                    }
+                    for name, data in index.sections().items():
+                        data = bytes(data)
+                        padding = -len(data) % SECTION_ALIGNMENT
+                        field_header['sections'][name] = [position, len(data)]
+                        chunks.append(data + b'\0' * padding)
+                        position += len(data) + padding
+                    header['fields'][field] = field_header
+            
+            header_bytes = json.dumps(header).encode('utf-8')
+            header_bytes += b' ' * (-(INDEX_PREAMBLE_SIZE + len(header_bytes)) % SECTION_ALIGNMENT)
+            
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            
+            # Write beside the target and rename so readers never map a partial file
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(INDEX_MAGIC)
+                f.write(array('I', [INDEX_FORMAT_VERSION, len(header_bytes)]).tobytes())
+                f.write(header_bytes)
+                for chunk in chunks:
+                    f.write(chunk)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+            
+            logging.info(f"Search index written to {path}")
+            return True
+        except Exception as e:
+            logging.error(f"Error writing search index to {path}: {e}")
+            return False
+    
+    def load(self, path):
+        """Memory-map an index file, returning False if it is missing or stale"""
+        if not os.path.exists(path):
+            return False
+        
+        try:
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            
+            view = memoryview(mapped)
+            preamble_end = INDEX_PREAMBLE_SIZE
+            if bytes(view[:len(INDEX_MAGIC)]) != INDEX_MAGIC:
+                logging.warning(f"Search index {path} is not an index file, rebuilding")
+                return False
+            
+            version, header_length = view[len(INDEX_MAGIC):preamble_end].cast('I')
+            if version != INDEX_FORMAT_VERSION:
+                logging.warning(f"Search index {path} has format version {version}, rebuilding")
+                return False
+            
+            header = json.loads(bytes(view[preamble_end:preamble_end + header_length]))
+            if header['byteorder'] != sys.byteorder:
+                logging.warning(f"Search index {path} was built with another byte order, rebuilding")
+                return False
+            
+            if self.is_stale(header['table_state']):
+                logging.warning(f"Search index {path} is stale, rebuilding")
+                return False
+            
+            data = view[preamble_end + header_length:]
+            for field, index in self.indexes.items():
+                field_header = header['fields'][field]
+                sections = {
+                    name: data[start:start + length]
+                    for name, (start, length) in field_header['sections'].items()
+                }
+                index.load_sections(sections, field_header['doc_count'], field_header['average_length'])
+            
+            # Category sets are small, so rebuild them from the category postings
+            category_index = self.indexes['category']
+            for position, category in enumerate(category_index.terms):
+                for recipe_id in category_index.postings_at(position):
+                    self.category_index[category].add(recipe_id)
+                    self.recipe_categories[recipe_id] = category
+            self.category_names = header['category_names']
+            
+            self._mmap = mapped
+            self.table_state = header['table_state']
+            self.change_seq = self.table_state['change_seq']
+            self.is_initialized = True
+            logging.info(f"Search index mapped from {path}")
+            return True
+        except Exception as e:
+            logging.error(f"Error loading search index from {path}: {e}")
+            self.reset()
+            return False
+    
+    def is_stale(self, table_state):
+        """Whether recipe writes happened since the index was built that the change log cannot replay"""
+        current = recipe_table_state()
+        if current['change_seq'] < table_state['change_seq']:
+            # The change log was reset, so the file belongs to another database
+            return True
+        if current['change_seq'] == table_state['change_seq']:
+            # Nothing was logged, so the recipe table must look exactly as it did
+            return current != table_state
+        # Rebuilding beats replaying a long log into every worker's private buffers
+        return current['change_seq'] - table_state['change_seq'] > REBUILD_CHANGE_COUNT
+    
+    def index_recipe(self, recipe):
+        """Queue a recipe's name, ingredient, tag and category terms for indexing"""
+        name_words, ingredient_words, tags = recipe_terms(recipe)
+        
+        for word in name_words:
+            self.indexes['name'].insert(word, recipe.id)
+        
+        for word in ingredient_words:
+            self.indexes['ingredient'].insert(word, recipe.id)
+        
+        for tag in tags:
+            self.indexes['tag'].insert(tag, recipe.id)
+        
+        # Index category
+        if recipe.category:
+            self.indexes['category'].insert(recipe.category, recipe.id)
+            self.category_index[recipe.category.lower()].add(recipe.id)
+            self.recipe_categories[recipe.id] = recipe.category.lower()
+            self.category_names[recipe.category.lower()] = recipe.category
+            self._facets = None
+    
+    def remove_recipe(self, recipe_id):
+        """Remove every posting of a recipe from the indices"""
+        for index in self.indexes.values():
+            index.remove(recipe_id)
+        
+        category = self.recipe_categories.pop(recipe_id, None)
+        if category is not None:
+            self.category_index[category].discard(recipe_id)
+            if not self.category_index[category]:
+                del self.category_index[category]
+                self.category_names.pop(category, None)
+            self._facets = None
+    
+    def apply_changes(self, changes):
+        """Apply recipe writes to the live indices
+
+        Args:
+            changes: Mapping of recipe ID to the recipe (or snapshot) to index,
+                or None when the recipe was deleted
+        """
+        with self.lock:
+            for recipe_id, recipe in changes.items():
+                self.remove_recipe(recipe_id)
+                if recipe is not None:
+                    self.index_recipe(recipe)
+            
+            for index in self.indexes.values():
+                if index.needs_compaction():
+                    index.freeze()
+    
+    def sync(self, force=False):
+        """Replay recipe writes logged by other workers since the last sync"""
+        if not force and time.monotonic() - self.last_sync < SYNC_INTERVAL:
+            return
+        self.last_sync = time.monotonic()
+        
+        try:
+            query = db.session.query(RecipeChange.id, RecipeChange.recipe_id).filter(
+                RecipeChange.id > self.change_seq
+            ).order_by(RecipeChange.id)
+            if self.index_path:
+                query = query.limit(REBUILD_CHANGE_COUNT + 1)
+            rows = query.all()
+            if not rows:
+                return
+            
+            if self.index_path and len(rows) > REBUILD_CHANGE_COUNT:
+                logging.info(f"Search index is over {REBUILD_CHANGE_COUNT} changes behind, reloading it")
+                self.reload()
+                return
+            
+            recipe_ids = sorted({recipe_id for _, recipe_id in rows})
+            recipes_by_id = {}
+            for start in range(0, len(recipe_ids), SYNC_CHUNK_SIZE):
+                chunk = recipe_ids[start:start + SYNC_CHUNK_SIZE]
+                recipes_by_id.update((recipe.id, recipe) for recipe in Recipe.query.filter(Recipe.id.in_(chunk)))
+            
+            self.apply_changes({recipe_id: recipes_by_id.get(recipe_id) for recipe_id in recipe_ids})
+            self.change_seq = rows[-1][0]
+            logging.info(f"Search indices synced {len(recipe_ids)} changed recipes")
+        except Exception as e:
+            logging.error(f"Error syncing search indices: {e}")
+    
+    def score(self, fragments, fields):
+        """BM25 score of every recipe matching any query fragment in the given fields"""
+        self.sync()
+        
+        scores = defaultdict(float)
+        with self.lock:
+            for fragment in fragments:
+                for field in fields:
+                    self.indexes[field].score_substring(fragment, FIELD_BOOSTS[field], scores)
+        return scores
+    
+    def rank(self, fragments, fields, limit):
+        """IDs of the top scoring recipes for the query fragments, best first"""
+        scores = self.score(fragments, fields)
+        
+        # Ties are broken by recipe ID so the order matches search cursors
+        top = heapq.nsmallest(limit, ((-score, recipe_id) for recipe_id, score in scores.items()))
+        return [recipe_id for _, recipe_id in top]
+    
+    def fetch_ranked(self, recipe_ids):
+        """Load recipes with a single IN query, preserving the ranked order"""
+        if not recipe_ids:
+            return []
+        
+        recipes = Recipe.query.filter(Recipe.id.in_(recipe_ids)).all()
+        recipes_by_id = {recipe.id: recipe for recipe in recipes}
+        return [recipes_by_id[recipe_id] for recipe_id in recipe_ids if recipe_id in recipes_by_id]
+    
     def search_recipes(self, query, limit=20):
         """Search recipes using multiple criteria"""
         if not self.is_initialized:
@@ -130,110 +747,76 @@ class RecipeSearchEngine:
         if not query:
             return []
         
-        # Collect recipe IDs from different search methods
-        recipe_ids = set()
-        
-        # Search in recipe names
-        name_matches = self.name_trie.search_partial(query)
-        recipe_ids.update(name_matches)
-        
-        # Search in ingredients
-        ingredient_matches = self.ingredient_trie.search_partial(query)
-        recipe_ids.update(ingredient_matches)
+        recipe_ids = self.rank(query_fragments(query), FIELD_BOOSTS, limit)
+        return self.fetch_ranked(recipe_ids)
+    
+    def search_page(self, query, cursor=None, per_page=12, category=None):
+        """One page of ranked search results, continuing after a cursor
+
+        Every page scores the query once and keeps the best per_page results
+        past the cursor, so deep pages cost the same as the first one.
+
+        Args:
+            query: Search text
+            cursor: Token from a previous page's next_cursor, or None for the first page
+            per_page: Results per page
+            category: Only return recipes in this category
+
+        Returns:
+            SearchPage of recipes in rank order
+
+        Raises:
+            ValueError: If the cursor is not a valid token
+        """
+        after = decode_cursor(cursor) if cursor else None
+        if not self.is_initialized:
+            self.build_indices()
         
-        # Search in tags
-        tag_matches = self.tag_trie.search_partial(query)
-        recipe_ids.update(tag_matches)
+        query = query.strip()
+        if not query:
+            return SearchPage([], cursor, None, [])
         
-        # Search in categories
-        for category, ids in self.category_index.items():
-            if query.lower() in category:
-                recipe_ids.update(ids)
+        scores = self.score(query_fragments(query), FIELD_BOOSTS)
+        matched_ids = list(scores)
         
-        # Search for multiple words
-        words = query.split()
-        if len(words) > 1:
-            for word in words:
-                if len(word) >= 2:  # Only search words with 2+ characters
-                    name_matches = self.name_trie.search_partial(word)
-                    recipe_ids.update(name_matches)
-                    
-                    ingredient_matches = self.ingredient_trie.search_partial(word)
-                    recipe_ids.update(ingredient_matches)
-                    
-                    tag_matches = self.tag_trie.search_partial(word)
-                    recipe_ids.update(tag_matches)
+        positions = ((-score, recipe_id) for recipe_id, score in scores.items())
+        if category:
+            category = category.lower()
+            positions = (position for position in positions if self.recipe_categories.get(position[1]) == category)
+        if after is not None:
+            last = (-after[0], after[1])
+            positions = (position for position in positions if position > last)
         
-        # Get recipes from database
-        if recipe_ids:
-            recipes = Recipe.query.filter(Recipe.id.in_(recipe_ids)).limit(limit).all()
-            
-            # Sort by relevance (simple approach - could be improved)
-            def relevance_score(recipe):
-                score = 0
-                query_lower = query.lower()
-                
-                # Higher score for exact name matches
-                if recipe.name and query_lower in recipe.name.lower():
-                    score += 10
-                
-                # Medium score for ingredient matches
-                if recipe.ingredients:
-                    try:
-                        ingredients = json.loads(recipe.ingredients)
-                        for ingredient in ingredients:
-                            ingredient_text = str(ingredient).lower()
-                            if query_lower in ingredient_text:
-                                score += 5
-                    except:
-                        if query_lower in recipe.ingredients.lower():
-                            score += 5
-                
-                # Lower score for tag matches
-                if recipe.tags:
-                    try:
-                        tags = json.loads(recipe.tags)
-                        for tag in tags:
-                            if query_lower in str(tag).lower():
-                                score += 3
-                    except:
-                        if query_lower in recipe.tags.lower():
-                            score += 3
-                
-                # Category matches
-                if recipe.category and query_lower in recipe.category.lower():
-                    score += 7
-                
-                return score
-            
-            recipes.sort(key=relevance_score, reverse=True)
-            return recipes
+        # Take one extra result to learn whether another page follows
+        top = heapq.nsmallest(per_page + 1, positions)
+        next_cursor = None
+        if len(top) > per_page:
+            top = top[:per_page]
+            next_cursor = encode_cursor(-top[-1][0], top[-1][1])
         
-        return []
+        recipes = self.fetch_ranked([recipe_id for _, recipe_id in top])
+        return SearchPage(recipes, cursor, next_cursor, matched_ids)
     
     def search_by_ingredients(self, ingredients_list, limit=20):
-        """Search recipes that contain any of the specified ingredients"""
-        if not self.is_initialized:
-            self.build_indices()
-        
-        recipe_ids = set()
-        
+        """Search recipes that contain any of the specified ingredients, most matched first
+
+        Each ingredient is a prefix lookup against the indexed recipe_ingredient
+        table, one query per ingredient.
+        """
+        matched = Counter()
         for ingredient in ingredients_list:
-            ingredient = ingredient.strip()
-            if ingredient:
-                matches = self.ingredient_trie.search_partial(ingredient)
-                recipe_ids.update(matches)
-        
-        if recipe_ids:
-            recipes = Recipe.query.filter(Recipe.id.in_(recipe_ids)).limit(limit).all()
-            return recipes
+            if ingredient.strip():
+                matched.update(row.id for row in Recipe.with_ingredient(ingredient).with_entities(Recipe.id))
         
-        return []
+        # Ties are broken by recipe ID so results are stable
+        top = heapq.nsmallest(limit, ((-count, recipe_id) for recipe_id, count in matched.items()))
+        return self.fetch_ranked([recipe_id for _, recipe_id in top])
     
     def search_by_category(self, category, limit=20):
         """Search recipes by category"""
         if not self.is_initialized:
             self.build_indices()
+        self.sync()
         
         category_lower = category.lower()
         recipe_ids = set()
@@ -243,7 +826,7 @@ class RecipeSearchEngine:
             recipe_ids.update(self.category_index[category_lower])
         
         # Partial category match
-        for cat, ids in self.category_index.items():
+        for cat, ids in list(self.category_index.items()):
             if category_lower in cat:
                 recipe_ids.update(ids)
         
@@ -253,6 +836,39 @@ class RecipeSearchEngine:
         
         return []
     
+    def category_facets(self, recipe_ids=None):
+        """Category names with their recipe counts, sorted by name
+
+        Args:
+            recipe_ids: Count only these recipes, such as the hits of the active search;
+                by default every recipe is counted from a cache rebuilt after recipe writes
+
+        Returns:
+            List of (category name, count) tuples
+        """
+        if not self.is_initialized:
+            self.build_indices()
+        self.sync()
+        
+        with self.lock:
+            if recipe_ids is not None:
+                counts = Counter(
+                    self.recipe_categories[recipe_id] for recipe_id in recipe_ids
+                    if recipe_id in self.recipe_categories
+                )
+            elif self._facets is not None:
+                return self._facets
+            else:
+                counts = {category: len(ids) for category, ids in self.category_index.items()}
+            
+            facets = sorted(
+                ((self.category_names.get(category, category), count) for category, count in counts.items()),
+                key=itemgetter(0)
+            )
+            if recipe_ids is None:
+                self._facets = facets
+            return facets
+    
     def get_popular_recipes(self, limit=20):
         """Get popular recipes (simple implementation - could use view counts, ratings, etc.)"""
         return Recipe.query.order_by(Recipe.id.desc()).limit(limit).all()
@@ -270,5 +886,40 @@ class RecipeSearchEngine:
         return query.limit(limit).all()
     
     def refresh_indices(self):
-        """Refresh search indices (call after adding new recipes)"""
+        """Rebuild search indices from scratch (recipe writes are applied incrementally)"""
         self.__init__()
+
+RECIPE_CHANGES_KEY = 'search_engine.recipe_changes'
+
+def _record_recipe_change(mapper, connection, target, deleted=False):
+    """Log a recipe write in the flush's transaction and queue it for this process"""
+    connection.execute(RecipeChange.__table__.insert().values(recipe_id=target.id))
+    
+    session = object_session(target)
+    if session is not None:
+        changes = session.info.setdefault(RECIPE_CHANGES_KEY, {})
+        changes[target.id] = None if deleted else RecipeSnapshot(target)
+
+@event.listens_for(Recipe, 'after_insert')
+def recipe_inserted(mapper, connection, target):
+    _record_recipe_change(mapper, connection, target)
+
+@event.listens_for(Recipe, 'after_update')
+def recipe_updated(mapper, connection, target):
+    _record_recipe_change(mapper, connection, target)
+
+@event.listens_for(Recipe, 'after_delete')
+def recipe_deleted(mapper, connection, target):
+    _record_recipe_change(mapper, connection, target, deleted=True)
+
+@event.listens_for(Session, 'after_commit')
+def apply_committed_recipe_changes(session):
+    """Apply this session's recipe writes to the live indices once they are durable"""
+    changes = session.info.pop(RECIPE_CHANGES_KEY, None)
+    if changes:
+        for engine in list(_live_engines):
+            engine.apply_changes(changes)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_recipe_changes(session):
+    session.info.pop(RECIPE_CHANGES_KEY, None)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Send the daily or weekly nutrition summary email to every user in one pass
+Users are read in ID order in batches, with one grouped query for the whole
+batch's nutrition totals, and the emails go out over a small pool of
+persistent SMTP connections. Each delivered summary is recorded, so a run
+that is interrupted or repeated on the same day only sends what is missing.
+In schedule mode the job runs at DAILY_SUMMARY_TIME every day, plus the
+weekly summary on WEEKLY_SUMMARY_DAY
+"""
+
+import argparse
+import logging
+import signal
+import sys
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import case, func, select
+from app import app, db
+from config import Config
+from email_service import MAIL_SHUTDOWN_TIMEOUT, EmailService, MailQueue
+from flask_mail import Message
+from health_calculator import HealthCalculator
+from models import DailyNutrition, DigestDelivery, User
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fat')
+
+def pending_users(kind, period, after_id, batch_size):
+    """Next batch of users, in ID order, who have not been sent this summary yet"""
+    delivered = select(DigestDelivery.user_id).where(DigestDelivery.kind == kind, DigestDelivery.period == period)
+    return User.query.filter(User.id > after_id, User.id.notin_(delivered)).order_by(User.id).limit(batch_size).all()
+
+def nutrition_totals(user_ids, day):
+    """Each user's totals for the 7 days ending on day and for day itself, from one grouped query"""
+    is_day = DailyNutrition.date == day
+    columns = [getattr(DailyNutrition, name) for name in NUTRIENTS]
+    rows = db.session.query(
+        DailyNutrition.user_id,
+        *[func.sum(column) for column in columns],
+        *[func.sum(case((is_day, column), else_=0)) for column in columns]
+    ).filter(
+        DailyNutrition.user_id.in_(user_ids),
+        DailyNutrition.date.between(day - timedelta(days=6), day)
+    ).group_by(DailyNutrition.user_id).all()
+
+    totals = {}
+    for row in rows:
+        week = dict(zip(NUTRIENTS, row[1:5]))
+        today = dict(zip(NUTRIENTS, row[5:9]))
+        totals[row[0]] = (week, today)
+    return totals
+
+def render_summary(kind, user, week, today, day):
+    """Subject and HTML body of one user's summary"""
+    weekly_summary = HealthCalculator.summarize_nutrition(week, 7)
+    recommendations = HealthCalculator.get_health_recommendations(user, weekly_summary)
+    if kind == 'daily':
+        return EmailService.render_daily_summary(user, today, recommendations, day)
+    return EmailService.render_weekly_summary(user, weekly_summary, recommendations, day)
+
+def record_deliveries(kind, period, user_ids):
+    """Mark summaries as sent so later runs skip them"""
+    if not user_ids:
+        return
+    db.session.execute(
+        DigestDelivery.__table__.insert(),
+        [{'user_id': user_id, 'kind': kind, 'period': period, 'sent_at': datetime.utcnow()} for user_id in user_ids]
+    )
+    db.session.commit()
+
+def send_digests(kind, day=None, connections=4, batch_size=1000):
+    """Send one kind of summary to every user who has not had it for the day
+
+    Returns:
+        Dictionary of sent, failed and already sent counts and the elapsed seconds
+    """
+    day = day or date.today()
+    empty = dict.fromkeys(NUTRIENTS, 0)
+    mail_queue = MailQueue(workers=connections)
+    delivered = []
+    skipped = db.session.query(func.count(DigestDelivery.id)).filter(
+        DigestDelivery.kind == kind, DigestDelivery.period == day
+    ).scalar()
+    started = time.perf_counter()
+    last_id = 0
+
+    logger.info(f"📨 Sending {kind} summaries for {day} ({skipped} already sent)")
+    try:
+        while True:
+            users = pending_users(kind, day, last_id, batch_size)
+            if not users:
+                break
+            last_id = users[-1].id
+
+            totals = nutrition_totals([user.id for user in users], day)
+            for user in users:
+                try:
+                    week, today = totals.get(user.id, (empty, empty))
+                    subject, html_body = render_summary(kind, user, week, today, day)
+                    message = Message(subject=subject, recipients=[user.email], html=html_body, body=html_body)
+                    mail_queue.enqueue(message, on_sent=lambda user_id=user.id: delivered.append(user_id))
+                except Exception as e:
+                    logger.error(f"Failed to render {kind} summary for user {user.id}: {e}")
+
+            # Keep one batch in flight while the next one renders, and record what went out so far
+            mail_queue.flush(pending=batch_size)
+            # Delivery threads only append, so taking a prefix never loses an ID
+            count = len(delivered)
+            record_deliveries(kind, day, delivered[:count])
+            del delivered[:count]
+
+            stats = mail_queue.stats()
+            elapsed = time.perf_counter() - started
+            logger.info(f"📬 {stats['sent']} sent, {stats['failed']} failed, {stats['pending']} in flight "
+                        f"({stats['sent'] / elapsed:.0f}/s)")
+
+        mail_queue.flush()
+    except BaseException:
+        # Stop sending on interruption, but wait for messages already on the wire so they get recorded
+        dropped = mail_queue.discard()
+        mail_queue.flush(timeout=MAIL_SHUTDOWN_TIMEOUT)
+        logger.warning(f"⚠️ Interrupted with {dropped} summaries unsent; rerun to send them")
+        raise
+    finally:
+        # Whatever was accepted before an interruption is not sent again on resume
+        db.session.rollback()
+        record_deliveries(kind, day, delivered)
+
+    stats = mail_queue.stats()
+    elapsed = time.perf_counter() - started
+    logger.info(f"✅ {kind.capitalize()} summaries: {stats['sent']} sent, {stats['failed']} failed, "
+                f"{skipped} already sent, in {elapsed:.1f}s ({stats['sent'] / elapsed if elapsed else 0:.0f}/s)")
+    return {'sent': stats['sent'], 'failed': stats['failed'], 'skipped': skipped, 'seconds': elapsed}
+
+def due_kinds(day):
+    """Summaries scheduled for a day by the config"""
+    kinds = []
+    if Config.SEND_DAILY_SUMMARIES:
+        kinds.append('daily')
+    if Config.SEND_WEEKLY_SUMMARIES and day.weekday() == Config.WEEKLY_SUMMARY_DAY:
+        kinds.append('weekly')
+    return kinds
+
+def run_schedule(connections, batch_size):
+    """Send each day's summaries at DAILY_SUMMARY_TIME, forever"""
+    send_at = datetime.strptime(Config.DAILY_SUMMARY_TIME, '%H:%M').time()
+    logger.info(f"⏰ Sending summaries daily at {Config.DAILY_SUMMARY_TIME}")
+    while True:
+        now = datetime.now()
+        due = datetime.combine(now.date(), send_at)
+        if now < due:
+            time.sleep((due - now).total_seconds())
+            continue
+
+        # Starting after today's send time catches up; runs already finished only skip everyone
+        for kind in due_kinds(now.date()):
+            with app.app_context():
+                try:
+                    send_digests(kind, now.date(), connections, batch_size)
+                except Exception as e:
+                    logger.error(f"❌ Error sending {kind} summaries: {e}")
+        time.sleep(max(0, (due + timedelta(days=1) - datetime.now()).total_seconds()))
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Send nutrition summary emails to every user')
+    parser.add_argument('kind', choices=['daily', 'weekly', 'schedule'],
+                        help='Summary to send now, or schedule to send them at the configured times')
+    parser.add_argument('--connections', type=int, default=4, help='SMTP connections to send over')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Users rendered per batch')
+    args = parser.parse_args()
+
+    # Stop through the normal exit path under process managers, so sent summaries are recorded
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+
+    if args.kind == 'schedule':
+        run_schedule(args.connections, args.batch_size)
+        return
+
+    with app.app_context():
+        try:
+            result = send_digests(args.kind, connections=args.connections, batch_size=args.batch_size)
+        except Exception as e:
+            logger.error(f"💥 Summary run failed: {e}")
+            sys.exit(1)
+
+    if result['failed']:
+        logger.error(f"💥 {result['failed']} summaries could not be sent; rerun to retry them")
+        sys.exit(1)
+    logger.info("🎉 Summary run complete!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Report what a worker pays at boot, import by import
+Imports the app in a fresh interpreter with -X importtime and lists the
+slowest top-level imports, then optionally times loading the ML stack and
+the food classifier model the way the first upload would
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+\d+ \|\s+(\S+)$')
+
+ML_PROBE = """
+import resource, sys, time
+import ml_model
+classifier = ml_model.FoodClassifier(backend=sys.argv[1])
+started = time.perf_counter()
+# Exported-model backends never import TensorFlow, so only keras pays for it
+available = ml_model.load_ml_dependencies() if sys.argv[1] == 'keras' else False
+imported = time.perf_counter()
+ready = classifier.ensure_loaded()
+loaded = time.perf_counter()
+print(available, ready, imported - started, loaded - imported, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+def import_times(statement):
+    """Microseconds a statement spends importing each top-level package, slowest first"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{statement!r} failed:\n{result.stderr[-2000:]}")
+
+    # Sum each module's own import time into its top-level package, so nested imports are not double counted
+    totals = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            package = match.group(2).split('.')[0]
+            totals[package] = totals.get(package, 0) + int(match.group(1))
+
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+def ml_load_times(backend='keras'):
+    """Seconds to import the ML stack and load the classifier, plus peak RSS in MB"""
+    result = subprocess.run([sys.executable, '-c', ML_PROBE, backend], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ML probe failed:\n{result.stderr[-2000:]}")
+
+    available, ready, import_seconds, load_seconds, max_rss_kb = result.stdout.split()[-5:]
+    return {
+        'ml_available': available == 'True',
+        'model_ready': ready == 'True',
+        'import_seconds': float(import_seconds),
+        'load_seconds': float(load_seconds),
+        'peak_rss_mb': int(max_rss_kb) / 1024
+    }
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Report worker boot cost per import')
+    parser.add_argument('--top', type=int, default=15, help='Number of imports to list')
+    parser.add_argument('--ml', action='store_true', help='Also time the deferred ML import and model load')
+    parser.add_argument('--backend', default='keras', help='Inference backend to load with --ml')
+    args = parser.parse_args()
+
+    timings = import_times('import app')
+    total = sum(microseconds for _, microseconds in timings)
+    print(f"Worker boot imports: {total / 1e6:.2f}s")
+    for module, microseconds in timings[:args.top]:
+        print(f"  {module:40}{microseconds / 1e3:10.1f} ms")
+
+    if args.ml:
+        ml = ml_load_times(args.backend)
+        print(f"Deferred until the first upload (or ML_WARMUP), {args.backend} backend:")
+        print(f"  ML dependencies available: {ml['ml_available']}, model ready: {ml['model_ready']}")
+        print(f"  {'tensorflow/keras/h5py import':40}{ml['import_seconds'] * 1e3:10.1f} ms")
+        print(f"  {'classifier model load':40}{ml['load_seconds'] * 1e3:10.1f} ms")
+        print(f"  {'peak RSS':40}{ml['peak_rss_mb']:10.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Test configuration: point the app at a throwaway SQLite database before it is imported
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_workdir = tempfile.mkdtemp(prefix='health-manager-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ['SEARCH_INDEX_PATH'] = os.path.join(_workdir, 'search_index.bin')
+
+import pytest
+from app import app as flask_app, db
+
+@pytest.fixture
+def app_context():
+    """Application context whose recipes are removed again after the test"""
+    from models import Recipe, RecipeChange
+    with flask_app.app_context():
+        yield flask_app
+        db.session.rollback()
+        for recipe in Recipe.query.all():
+            db.session.delete(recipe)
+        RecipeChange.query.delete()
+        db.session.commit()
+
+@pytest.fixture
+def add_recipes(app_context):
+    """Factory that stores recipes from (name, ingredient lines) pairs and returns them"""
+    from models import Recipe
+
+    def add(*recipes):
+        created = [
+            Recipe(name=name, ingredients=list(ingredients), instructions='Cook.', tags=[])
+            for name, ingredients in recipes
+        ]
+        db.session.add_all(created)
+        db.session.commit()
+        return created
+    return add
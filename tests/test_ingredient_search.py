@@ -0,0 +1,52 @@
+"""
+Ingredient search through the recipe_ingredient table, compared with the old word-prefix trie
+"""
+import pytest
+from search_engine import RecipeSearchEngine
+
+CATALOG = [
+    ('Chicken Stir Fry', ['1 lb chicken breast', '2 tbsp soy sauce', '1 cup broccoli']),
+    ('Chickpea Curry', ['2 cups chickpeas', '1 can diced tomatoes', '1 onion']),
+    ('Caprese Salad', ['2 large tomato', 'fresh mozzarella', 'basil leaves']),
+    ('Berry Smoothie', ['1 cup mixed berries', '1 banana', '1 cup milk']),
+    ('Strawberry Oats', ['1 cup oats', '1 strawberry, sliced']),
+    ('Mashed Potatoes', ['4 potatoes', '2 tbsp butter', 'salt and pepper']),
+    ('Garlic Bread', ['1 baguette', '4 cloves garlic', '2 tbsp butter'])
+]
+
+def baseline_prefix_matches(recipes, query):
+    """Recipe names the old ingredient trie returned: some ingredient word starts with the query"""
+    query = query.lower().strip()
+    return {
+        recipe.name for recipe in recipes
+        if any(word.startswith(query) for line in recipe.ingredients for word in line.lower().split())
+    }
+
+@pytest.mark.parametrize('query', ['chick', 'tomat', 'garl', 'berries', 'butter', 'pep', 'potatoes'])
+def test_matches_everything_the_prefix_trie_did(add_recipes, query):
+    recipes = add_recipes(*CATALOG)
+    found = {recipe.name for recipe in RecipeSearchEngine(recipes=[]).search_by_ingredients([query])}
+    assert baseline_prefix_matches(recipes, query) <= found
+
+@pytest.mark.parametrize('query, expected', [
+    ('chick', {'Chicken Stir Fry', 'Chickpea Curry'}),
+    ('tomatoes', {'Chickpea Curry', 'Caprese Salad'}),
+    ('tomato', {'Chickpea Curry', 'Caprese Salad'}),
+    ('berry', {'Berry Smoothie'}),
+    ('berries', {'Berry Smoothie'}),
+    ('potato', {'Mashed Potatoes'}),
+    ('olive oil', set())
+])
+def test_partial_and_plural_queries(add_recipes, query, expected):
+    add_recipes(*CATALOG)
+    found = {recipe.name for recipe in RecipeSearchEngine(recipes=[]).search_by_ingredients([query])}
+    assert found == expected
+
+def test_ranks_recipes_matching_more_ingredients_first(add_recipes):
+    add_recipes(*CATALOG)
+    results = RecipeSearchEngine(recipes=[]).search_by_ingredients(['butter', 'garlic'])
+    assert [recipe.name for recipe in results] == ['Garlic Bread', 'Mashed Potatoes']
+
+def test_blank_ingredients_match_nothing(add_recipes):
+    add_recipes(*CATALOG)
+    assert RecipeSearchEngine(recipes=[]).search_by_ingredients(['  ', '--']) == []
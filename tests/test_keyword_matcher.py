@@ -0,0 +1,58 @@
+"""
+Allergen and dietary-restriction keyword matching on words from the recipe catalog
+"""
+import pytest
+from health_recommendations import HealthRecommendationEngine
+
+@pytest.fixture(scope='module')
+def app_context_module():
+    from app import app
+    with app.app_context():
+        yield app
+
+@pytest.fixture(scope='module')
+def engine(app_context_module):
+    return HealthRecommendationEngine()
+
+def labels(engine, text, keywords_by_label):
+    """Labels whose keywords the engine's matcher finds in the text"""
+    bits = engine.keyword_flags.bits
+    found = {keyword for keyword, bit in bits.items() if engine.keyword_flags.encode(text) >> bit & 1}
+    return {label for label, keywords in keywords_by_label.items() if found & set(keywords)}
+
+@pytest.mark.parametrize('text, allergy', [
+    ('catfish', 'fish'),
+    ('swordfish steak', 'fish'),
+    ('breadcrumbs', 'wheat'),
+    ('cornbread', 'gluten'),
+    ('cheeseburger', 'dairy'),
+    ('cheesecake', 'dairy'),
+    ('creamy tomato soup', 'dairy'),
+    ('buttermilk pancakes', 'dairy'),
+    ('soybeans', 'soy'),
+    ('eggnog', 'eggs'),
+    ('scrambled eggs', 'eggs'),
+    ('crabmeat', 'shellfish'),
+    ('anchovies', 'fish'),
+    ('brazil nuts', 'tree nuts')
+])
+def test_compound_and_plural_words_are_flagged(engine, text, allergy):
+    assert allergy in labels(engine, text, engine.allergen_keywords)
+
+@pytest.mark.parametrize('text, label', [
+    ('hamburger bun', 'halal'),
+    ('hamburgers', 'kosher'),
+    ('graham crackers', 'halal'),
+    ('coconut milk', 'tree nuts'),
+    ('roasted eggplant', 'eggs'),
+    ('butternut squash', 'dairy'),
+    ('avocado toast', 'fish'),
+    ('shellfish stew', 'fish')
+])
+def test_words_that_only_look_like_a_keyword_are_not_flagged(engine, text, label):
+    keywords_by_label = {**engine.allergen_keywords, **engine.restriction_keywords}
+    assert label not in labels(engine, text, keywords_by_label)
+
+def test_restrictions_catch_compound_meat_words(engine):
+    assert 'vegetarian' in labels(engine, 'spaghetti and meatballs', engine.restriction_keywords)
+    assert 'halal' in labels(engine, 'glazed ham', engine.restriction_keywords)
@@ -0,0 +1,38 @@
+"""
+Change log replay into a memory-mapped search index
+"""
+import search_engine
+from app import db
+from models import RecipeChange
+from search_engine import RecipeSearchEngine
+
+def log_changes(recipes, times):
+    """Log writes the way another worker's flushes would"""
+    db.session.execute(RecipeChange.__table__.insert(), [{'recipe_id': recipe.id} for recipe in recipes] * times)
+    db.session.commit()
+
+def test_long_replay_rewrites_and_remaps_the_index_file(add_recipes, tmp_path, monkeypatch):
+    monkeypatch.setattr(search_engine, 'REBUILD_CHANGE_COUNT', 5)
+    recipes = add_recipes(('Pumpkin Soup', ['1 pumpkin']), ('Pumpkin Pie', ['1 pumpkin', 'flour']))
+    path = str(tmp_path / 'search_index.bin')
+    engine = RecipeSearchEngine(index_path=path)
+    assert engine._mmap is not None
+
+    log_changes(recipes, 4)
+    engine.sync(force=True)
+
+    assert engine._mmap is not None
+    assert engine.change_seq == db.session.query(db.func.max(RecipeChange.id)).scalar()
+    assert {recipe.name for recipe in engine.search_recipes('pumpkin')} == {'Pumpkin Soup', 'Pumpkin Pie'}
+    assert RecipeSearchEngine(index_path=path).change_seq == engine.change_seq
+
+def test_replay_loads_recipes_in_chunks(add_recipes, monkeypatch):
+    monkeypatch.setattr(search_engine, 'SYNC_CHUNK_SIZE', 2)
+    recipes = add_recipes(*[(f'Lentil Stew {i}', ['lentils']) for i in range(5)])
+    engine = RecipeSearchEngine(recipes=[])
+    assert engine.search_recipes('lentil') == []
+    engine.change_seq = 0
+
+    engine.sync(force=True)
+
+    assert len(engine.search_recipes('lentil', limit=10)) == len(recipes)